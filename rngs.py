@@ -33,9 +33,71 @@
 #  * Language          : Python 3.3
 #  * Latest Revision   : 3/26/14
 #  *
+#  * The functions random_block(n) and fill(buffer) return the next n values
+#  * of a stream in one call.  The stream is advanced exactly as n calls to
+#  * random() would advance it, so the values are bit-identical to the scalar
+#  * sequence.  NumPy is used when it is available (the result is then a
+#  * float64 ndarray), otherwise the block is an array('d').
+#  *
+#  * skip(n) jumps a stream n calls ahead (or back, if n < 0) in O(log n)
+#  * time using jump_multiplier(n) = a^n mod m, so that, for example,
+#  * replication k of a batch can be handed its starting state directly.
+#  *
+#  * Each stream is a Stream object and the 256 streams form a StreamSet.
+#  * The module level functions act on a default StreamSet; programs that
+#  * draw heavily from several streams can instead take the bound method
+#  * stream.random of a Stream, which avoids selecting the stream before
+#  * every draw, and independent StreamSet objects may be used side by side.
+#  *
+#  * plantSeeds(x, count) changes the number of streams from 256 to count,
+#  * with the planted seeds then separated by (m - 1) / count calls;
+#  * separation() reports the guaranteed non-overlap distance.
+#  *
+#  * useBackend('mrg32k3a') replaces the Lehmer streams by L'Ecuyer's
+#  * MRG32k3a generator, with streams and substreams, behind the same
+#  * functions (the state of a stream is then a tuple of six integers).
+#  * useBackend('philox') selects the counter-based Philox4x32-10 generator,
+#  * where selectReplication(r) gives each replication its own independent
+#  * values of every stream without any coordination between workers.
+#  *
+#  * prefetch() makes the streams generate their values in blocks behind
+#  * the scalar random() call; the sequence of values is unchanged.  Setting
+#  * the environment variable RNGS_PREFETCH to a buffer size turns this on
+#  * for a program without editing it.
+#  *
+#  * A StreamVector holds K Lehmer states in one ndarray and advances all
+#  * of them at once, e.g. to draw the next value of K replications.
+#  *
+#  * get_state() and set_state(state) capture and restore the whole
+#  * generator; save_state(path) and load_state(path) do the same through a
+#  * small versioned binary file so that long runs can be checkpointed.
+#  *
+#  * For variance reduction, antithetic() makes every stream return 1 - u
+#  * in place of u, and selectReplication(r) starts every stream at the
+#  * values reserved for replication r with any generator, so that runs of
+#  * different scenarios with the same r see the same values on the same
+#  * streams (common random numbers).  replicate(run, scenarios, n) runs
+#  * such paired replications and pairedDifference(x, y) reports how much
+#  * the pairing has reduced the variance of a difference.
+#  *
 #  * ------------------------------------------------------------------------- 
 
+
 from time import time
+from array import array
+from collections import deque
+from functools import lru_cache
+from itertools import chain
+from operator import length_hint
+import atexit
+import os
+import struct
+import warnings
+
+try:
+  import numpy
+except ImportError:                    #/* block generation falls back to */
+  numpy = None                         #/* a pure Python loop             */
 
 #global consts
 MODULUS = 2147483647 #/* DON'T CHANGE THIS VALUE                  */
@@ -43,77 +105,1453 @@ MULTIPLIER = 48271      #/* DON'T CHANGE THIS VALUE                  */
 CHECK = 399268537  #/* DON'T CHANGE THIS VALUE                  */
 STREAMS = 256        #/* # of streams, DON'T CHANGE THIS VALUE    */
 A256 = 22925      #/* jump multiplier, DON'T CHANGE THIS VALUE */
+SEPARATION = 8367782 #/* # of calls between A256 planted seeds     */
 DEFAULT = 123456789  #/* initial seed, use 0 < DEFAULT < MODULUS  */
+BLOCK = 65536        #/* # of states computed per vectorized pass  */
+PREFETCH = 4096      #/* default buffer size of prefetched streams */
+REPLICATION = 65536  #/* default values per Lehmer replication     */
+Q = MODULUS // MULTIPLIER  #/* Schrage's decomposition m = a * Q + R  */
+R = MODULUS % MULTIPLIER
 
 #statics
-stream = 0
-initialized = 0
-seed = [DEFAULT]
-for i in range(1,STREAMS):
-  seed.append(DEFAULT)
+powers = None        #/* MULTIPLIER^k mod MODULUS, k = 1,...,BLOCK  */
+generation = 0       #/* counts the replacements of stream objects  */
+
+
+def newGeneration():
+  # /* ---------------------------------------------------------------------
+  #  * Called whenever a set replaces the stream objects it hands out (on
+  #  * resize and rewrap, and so by useBackend, countDraws, antithetic and
+  #  * prefetch), so that bound methods cached elsewhere, e.g. by the rvgs
+  #  * dist objects, can tell that they must be taken again.
+  #  * ---------------------------------------------------------------------
+  #  */
+  global generation
+
+  generation += 1
+
+
+@lru_cache(maxsize=32)
+def jump_multiplier(n):
+  # /* ---------------------------------------------------------------------
+  #  * Returns the multiplier a^n mod m which, applied to the state, has the
+  #  * same effect as n calls to random().  The period is m - 1 so n may be
+  #  * negative.  Recently used multipliers are cached.
+  #  * ---------------------------------------------------------------------
+  #  */
+  return pow(MULTIPLIER, n % (MODULUS - 1), MODULUS)
+
+
+def separationFor(count):
+  # /* the separation of the planted seeds of count Lehmer streams */
+  if (count < 1) or (count > MODULUS - 1):
+    raise ValueError("the number of streams must be in 1..MODULUS - 1")
+  if (count == STREAMS):
+    return SEPARATION
+  return (MODULUS - 1) // count
+
+
+class BlockStream:
+  # /* ---------------------------------------------------------------------
+  #  * The fill and block methods shared by the streams of every generator.
+  #  * A subclass provides random() and fillArray(out), which overwrites the
+  #  * contiguous float64 ndarray out with its next len(out) values, and
+  #  * may replace fillSequence, the loop used without NumPy.
+  #  * ---------------------------------------------------------------------
+  #  */
+  __slots__ = ()
+
+  def fill(self, buffer):
+    # /* -------------------------------------------------------------------
+    #  * Overwrites every element of buffer (an ndarray, array('d') or list)
+    #  * in place with the next len(buffer) random numbers of this stream.
+    #  * -------------------------------------------------------------------
+    #  */
+    if (numpy is not None) and (not isinstance(buffer, list)):
+      out = numpy.asarray(buffer)
+      if (out.dtype != numpy.float64) or (not out.flags.writeable):
+        raise TypeError("fill() needs a writable float64 buffer")
+      if (out.flags.c_contiguous):
+        self.fillArray(out.reshape(-1))
+      else:                              #/* reshape would copy a strided */
+        flat = numpy.empty(out.size)     #/* view, so the values are      */
+        self.fillArray(flat)             #/* copied into it               */
+        out[...] = flat.reshape(out.shape)
+      return buffer
+    return self.fillSequence(buffer)
+
+  def fillSequence(self, buffer):
+    draw = self.random
+    for i in range(0,len(buffer)):
+      buffer[i] = draw()
+    return buffer
+
+  def block(self, n):
+    if (numpy is not None):
+      out = numpy.empty(n, dtype=numpy.float64)
+    else:
+      out = array('d', bytes(8 * n))
+    return self.fill(out)
+
+
+class Stream(BlockStream):
+  # /* ---------------------------------------------------------------------
+  #  * A single Lehmer stream.  The state is the only per-stream data, so
+  #  * the bound method random can be handed to a generator directly.
+  #  * ---------------------------------------------------------------------
+  #  */
+  __slots__ = ('seed',)
+
+  def __init__(self, x=DEFAULT):
+    self.seed = x
+
+  def random(self):
+    #/* ---------------------------------------------------------------------
+    #* Random is a Lehmer generator that returns a pseudo-random real number
+    #* uniformly distributed between 0.0 and 1.0.  The period is (m - 1)
+    #* where m = 2,147,483,647 amd the smallest and largest possible values
+    #* are (1 / m) and 1 - (1 / m) respectively.
+    #* ---------------------------------------------------------------------
+    #*/
+    x = self.seed
+    t = MULTIPLIER * (x % Q) - R * (x // Q)
+    if (t > 0):
+      self.seed = t
+    else:
+      self.seed = t = t + MODULUS
+
+    return t / MODULUS
+
+  def putSeed(self, x):
+    self.seed = seedValue(x)
+
+  def getSeed(self):
+    return self.seed
+
+  def fillArray(self, out):
+    self.seed = lehmerBlock(self.seed, out)
+
+  def fillSequence(self, buffer):
+    x = self.seed
+    for i in range(0,len(buffer)):
+      t = MULTIPLIER * (x % Q) - R * (x // Q)
+      if (t > 0):
+        x = t
+      else:
+        x = t + MODULUS
+      buffer[i] = x / MODULUS
+    self.seed = x
+    return buffer
+
+  def skip(self, n):
+    self.seed = (jump_multiplier(n) * self.seed) % MODULUS
+
+
+class StreamSet:
+  # /* ---------------------------------------------------------------------
+  #  * A set of Lehmer streams together with the index of the current stream.
+  #  * The methods mirror the module level functions below, which act on
+  #  * the default set.
+  #  *
+  #  * The number of streams defaults to STREAMS but any count may be given
+  #  * to plantSeeds.  The planted states are kept in an array('l') and a
+  #  * Stream object is only created for a stream when it is first used.
+  #  * ---------------------------------------------------------------------
+  #  */
+  name = 'lehmer'
+  default = DEFAULT                    #/* planted if a stream is used */
+                                       #/* before plantSeeds           */
+  longest = None                       #/* longest replication, if not */
+                                       #/* the separation              */
+  __slots__ = ('count', 'separation', 'jump', 'seeds', 'live', 'current',
+               'stream', 'initialized', 'counting', 'buffering', 'flipped',
+               'origin', 'replication', 'replications', 'length',
+               'selected')
+
+  def __init__(self, count=STREAMS):
+    self.stream = 0
+    self.initialized = 0
+    self.counting = False
+    self.buffering = 0
+    self.flipped = False
+    self.replication = 0
+    self.length = self.longest or REPLICATION
+    self.selected = False
+    self.resize(count)
+
+  def resize(self, count):
+    # /* -------------------------------------------------------------------
+    #  * Sets the number of streams and the matching jump multiplier.  With
+    #  * STREAMS streams the published jump multiplier A256 is used, so the
+    #  * planted seeds are those of the original library; otherwise the
+    #  * period is divided evenly among the streams.
+    #  * -------------------------------------------------------------------
+    #  */
+    self.separation = separationFor(count)
+    self.jump = jump_multiplier(self.separation)
+    self.replications = self.separation // self.length
+    self.count = count
+    self.seeds = array('l', [DEFAULT]) * count
+    self.origin = DEFAULT
+    self.live = {}
+    newGeneration()
+    self.stream = self.stream % count
+    self.current = self.get(self.stream)
+
+  def random(self):
+    return self.current.random()
+
+  def plantSeeds(self, x, count=None):
+    # /* --------------------------------------------------------------------
+    #  * Use this function to set the state of all the random number generator
+    #  * streams by "planting" a sequence of states (seeds), one per stream,
+    #  * with all states dictated by the state of the default stream.
+    #  * The sequence of planted states is separated one from the next by
+    #  * self.separation (8,367,782 for 256 streams) calls to Random().
+    #  * ---------------------------------------------------------------------
+    #  */
+    if (count is not None) and (count != self.count):
+      self.resize(count)
+
+    self.initialized = 1
+    self.origin = seedValue(x)
+    self.replication = 0
+    self.restart(self.origin)
+    self.limitCounts(False)
+
+  def restart(self, x):
+    # /* plants x and the states that follow it as the seeds of the */
+    # /* streams and moves the streams in use to them                */
+    seeds = self.seeds
+    jump = self.jump
+    seeds[0] = x                           #/* set seed[0]                 */
+    for j in range(1,self.count):
+      x = (jump * x) % MODULUS
+      seeds[j] = x
+    for j, s in self.live.items():         #/* and the streams in use      */
+      s.putSeed(seeds[j])
+
+  def selectReplication(self, r, length=None):
+    # /* -------------------------------------------------------------------
+    #  * Moves every stream to the start of replication r, r = 0, 1, ...,
+    #  * self.replications - 1: each stream's segment of separation values
+    #  * is divided into replications of length values, REPLICATION (2^16)
+    #  * until another length is given (127 replications with 256 streams;
+    #  * fewer streams or shorter replications give more).  With countDraws
+    #  * on, a stream warns once it draws more than length values, where
+    #  * it would run into the next replication.
+    #  * -------------------------------------------------------------------
+    #  */
+    if (length is not None):
+      self.setLength(length, self.separation)
+      self.replications = self.separation // length
+    if (r < 0) or (r >= self.replications):
+      raise ValueError("the replication must be in 0..{0}".format(
+                       self.replications - 1))
+    if (self.initialized == 0):
+      self.plantSeeds(self.default)
+    self.replication = r
+    self.restart(jump_multiplier(r * self.length) * self.origin % MODULUS)
+    self.limitCounts(True)
+
+  def setLength(self, length, longest):
+    # /* sets the values each stream may draw in one replication */
+    if (length < 1) or (length > longest):
+      raise ValueError("the replication length must be in 1..{0}".format(
+                       longest))
+    self.length = length
+
+  def countLimit(self):
+    # /* the draws a counted stream may make: the replication length */
+    # /* once a replication is selected, otherwise the separation     */
+    if (self.selected):
+      return self.length
+    return self.separation
+
+  def limitCounts(self, selected):
+    self.selected = selected
+    limit = self.countLimit()
+    for s in self.live.values():
+      if (isinstance(s, CountedStream)):
+        s.limit = limit
+
+  def putSeed(self, x):
+    self.current.putSeed(x)
+
+  def getSeed(self):
+    return self.current.getSeed()
+
+  def selectStream(self, index):
+    #/* ------------------------------------------------------------------
+    #* Use this function to set the current random number generator
+    #* stream -- that stream from which the next random number will come.
+    #* ------------------------------------------------------------------
+    #*/
+    self.current = self.get(index)
+    self.stream = index % self.count
+
+  def get(self, index=None):
+    # /* -------------------------------------------------------------------
+    #  * Returns the Stream with the given index (the current stream if the
+    #  * index is None) without changing the current stream.
+    #  * -------------------------------------------------------------------
+    #  */
+    if (index is None):
+      return self.current
+    index = index % self.count
+    if (self.initialized == 0) and (index != 0):   #/* protect against */
+      self.plantSeeds(self.default)                #/* un-initialized  */
+    s = self.live.get(index)                       #/* streams         */
+    if (s is None):
+      s = self.live[index] = self.wrap(index, self.newStream(index), None)
+    return s
+
+  def wrap(self, index, s, counted):
+    # /* buffers, reflects and/or counts the stream s as this set        */
+    # /* requires; counted is the CountedStream that already counts it, */
+    # /* if any                                                          */
+    if (self.buffering):
+      s = BufferedStream(s, self.buffering)
+    if (self.flipped):
+      s = AntitheticStream(s)
+    if (self.counting):
+      if (counted is None):
+        counted = CountedStream(s, index, self.countLimit())
+      else:
+        counted.source = s
+      s = counted
+    return s
+
+  def rewrap(self):
+    # /* -------------------------------------------------------------------
+    #  * Rewraps every stream in use after the counting, antithetic or
+    #  * buffering mode changes.  Buffers are flushed first so no values are
+    #  * lost, but bound methods taken from the streams earlier keep their
+    #  * old behaviour.
+    #  * -------------------------------------------------------------------
+    #  */
+    for j, s in list(self.live.items()):
+      counted = s if isinstance(s, CountedStream) else None
+      if (counted is not None):
+        s = counted.source
+      if isinstance(s, AntitheticStream):
+        s = s.source
+      if isinstance(s, BufferedStream):
+        s.flush()
+        s = s.source
+      self.live[j] = self.wrap(j, s, counted)
+    self.current = self.live[self.stream]
+    newGeneration()
+
+  def countDraws(self, enable=True):
+    # /* switches the per-stream draw counters on or off */
+    self.counting = enable
+    self.rewrap()
+
+  def antithetic(self, enable=True):
+    # /* switches every stream to returning 1 - u in place of u, or back */
+    self.flipped = enable
+    self.rewrap()
+
+  def prefetch(self, size=PREFETCH):
+    # /* -------------------------------------------------------------------
+    #  * Makes every stream generate its values size at a time into a
+    #  * buffer that random() then reads from (size = 0 switches this off).
+    #  * The values are exactly those of the unbuffered stream.
+    #  * -------------------------------------------------------------------
+    #  */
+    if (size < 0):
+      raise ValueError("the prefetch size must be non-negative")
+    self.buffering = size
+    self.rewrap()
+
+  def drawCounts(self):
+    # /* returns {stream index: draws} for the counted streams in use */
+    return dict((j, s.draws) for j, s in sorted(self.live.items())
+                if isinstance(s, CountedStream))
+
+  def newStream(self, index):
+    return Stream(self.seeds[index])
+
+  def sync(self):
+    # /* -------------------------------------------------------------------
+    #  * Copies the state of every stream in use back into self.seeds and
+    #  * returns that array.
+    #  * -------------------------------------------------------------------
+    #  */
+    seeds = self.seeds
+    for j, s in self.live.items():
+      seeds[j] = s.getSeed()
+    return seeds
+
+  def getState(self):
+    # /* the state of every stream followed by the planted seed, the    */
+    # /* replication and its length, as a list of non-negative integers */
+    return list(self.sync()) + [self.origin, self.replication, self.length]
+
+  def setState(self, state):
+    if (len(state) == self.count + 3):
+      self.length = state[-1]
+      self.replications = self.separation // self.length
+      state = state[:-1]
+    if (len(state) == self.count + 2):  #/* a version 2 state has no length */
+      self.origin, self.replication = state[-2:]
+      state = state[:-2]
+    elif (len(state) != self.count):  #/* a version 1 state has no origin */
+      raise ValueError("the state does not match {0} streams".format(self.count))
+    self.seeds = array('l', state)
+    for j, s in self.live.items():
+      s.putSeed(self.seeds[j])
+
+
+class StreamVector:
+  # /* ---------------------------------------------------------------------
+  #  * K Lehmer states held in one int64 ndarray and advanced together, so
+  #  * that K replications can each draw their next value in one vectorized
+  #  * operation.  The states are ordinary Lehmer seeds: a StreamVector can
+  #  * be taken from, or stored back into, the streams of a StreamSet, and
+  #  * plant(x, K) gives the seeds that StreamSet.plantSeeds(x, K) plants.
+  #  * Every product is less than 2^62 so int64 arithmetic is exact.
+  #  * ---------------------------------------------------------------------
+  #  */
+  __slots__ = ('seeds',)
+
+  def __init__(self, seeds):
+    if (numpy is None):
+      raise ImportError("StreamVector needs NumPy")
+    self.seeds = numpy.array(seeds, dtype=numpy.int64).reshape(-1)
+    if (len(self.seeds) > 0) and ((self.seeds.min() <= 0) or
+                                   (self.seeds.max() >= MODULUS)):
+      raise ValueError("seeds must be in 1..MODULUS - 1")
+
+  @classmethod
+  def plant(cls, x, count=STREAMS):
+    # /* the planted seeds of count streams, built by doubling */
+    jump = jump_multiplier(separationFor(count))
+    seeds = numpy.array([seedValue(x)], dtype=numpy.int64)
+    j = jump
+    while (len(seeds) < count):
+      seeds = numpy.concatenate((seeds, seeds * j % MODULUS))
+      j = j * j % MODULUS
+    return cls(seeds[:count])
+
+  @classmethod
+  def fromSet(cls, streams, indexes=None):
+    # /* the current states of some (by default all) streams of a set */
+    seeds = streams.sync()
+    if (indexes is None):
+      indexes = range(0,streams.count)
+    return cls([seeds[j] for j in indexes])
+
+  def store(self, streams, indexes=None):
+    # /* writes the states back into some (by default all) streams */
+    if (indexes is None):
+      indexes = range(0,streams.count)
+    for j, x in zip(indexes, self.seeds.tolist()):
+      streams.get(j).putSeed(x)
+
+  def __len__(self):
+    return len(self.seeds)
+
+  def random(self, m=1):
+    # /* advances every state by m steps and returns the K new values */
+    self.seeds = self.seeds * jump_multiplier(m) % MODULUS
+    return self.seeds / MODULUS
+
+  def block(self, n):
+    # /* ---------------------------------------------------------------------
+    #  * Returns an n by K array whose row k holds the values of draw k + 1
+    #  * of every stream, and advances every state by n steps.
+    #  * ---------------------------------------------------------------------
+    #  */
+    out = numpy.empty((n, len(self.seeds)), dtype=numpy.float64)
+    p = lehmerPowers()
+    x = self.seeds
+    for i in range(0,n,BLOCK):
+      c = min(BLOCK, n - i)
+      s = numpy.outer(p[:c], x) % MODULUS
+      numpy.divide(s, MODULUS, out=out[i:i + c])
+      x = s[-1]
+    if (n > 0):
+      self.seeds = x.copy()
+    return out
+
+  def skip(self, n):
+    self.seeds = self.seeds * jump_multiplier(n) % MODULUS
+
+  def getSeeds(self):
+    return self.seeds.tolist()
+
+
+# /* -----------------------------------------------------------------------
+#  * MRG32k3a is the combined multiple recursive generator of L'Ecuyer,
+#  *
+#  *       "Good Parameters and Implementations for Combined Multiple
+#  *                  Recursive Random Number Generators"
+#  *                         Pierre L'Ecuyer
+#  *               Operations Research, 47(1), 1999
+#  *
+#  * with a period of about 2^191.  As in L'Ecuyer's RngStreams package the
+#  * streams start 2^127 values apart and each stream is divided into
+#  * substreams of 2^76 values.  The state is six integers; the first three
+#  * must be less than M1 and the last three less than M2, and neither
+#  * triple may be all zero.
+#  * -----------------------------------------------------------------------
+#  */
+M1 = 4294967087
+M2 = 4294944443
+A12 = 1403580
+A13N = 810728
+A21 = 527612
+A23N = 1370589
+NORM = 2.328306549295727688e-10       #/* 1 / (M1 + 1)                 */
+MRGSTREAM = 2 ** 127                  #/* # of values in a stream       */
+MRGSUBSTREAM = 2 ** 76                #/* # of values in a substream    */
+MRGDEFAULT = (12345, 12345, 12345, 12345, 12345, 12345)
+MRGCHECK = (3692455944, 1366884236, 2968912127,   #/* RngStreams' second */
+            335948734, 4161675175, 475798818)      #/* stream             */
+
+
+def matMul(a, b, m):
+  # /* 3 by 3 matrix product a * b mod m */
+  return tuple(tuple(sum(a[i][k] * b[k][j] for k in range(0,3)) % m
+                     for j in range(0,3)) for i in range(0,3))
+
+
+def matPow(a, e, m):
+  # /* a^e mod m by repeated squaring */
+  r = ((1, 0, 0), (0, 1, 0), (0, 0, 1))
+  while (e > 0):
+    if (e & 1):
+      r = matMul(r, a, m)
+    a = matMul(a, a, m)
+    e >>= 1
+  return r
+
+
+def matVec(a, v, m):
+  # /* 3 by 3 matrix a times the vector v mod m */
+  return [sum(a[i][k] * v[k] for k in range(0,3)) % m for i in range(0,3)]
+
+
+MRGA1 = ((0, 1, 0), (0, 0, 1), (M1 - A13N, A12, 0))
+MRGA2 = ((0, 1, 0), (0, 0, 1), (M2 - A23N, 0, A21))
+A1P127 = matPow(MRGA1, MRGSTREAM, M1)          #/* stream jump matrices    */
+A2P127 = matPow(MRGA2, MRGSTREAM, M2)
+A1P76 = matPow(MRGA1, MRGSUBSTREAM, M1)        #/* substream jump matrices */
+A2P76 = matPow(MRGA2, MRGSUBSTREAM, M2)
+
+
+@lru_cache(maxsize=32)
+def mrgJump(n):
+  # /* the pair of matrices that advance MRG32k3a by n values; the */
+  # /* component periods are M1^3 - 1 and M2^3 - 1 so n may be < 0  */
+  return (matPow(MRGA1, n % (M1 ** 3 - 1), M1),
+          matPow(MRGA2, n % (M2 ** 3 - 1), M2))
+
+
+def mrgJumpState(a1, a2, s):
+  return matVec(a1, s[0:3], M1) + matVec(a2, s[3:6], M2)
+
+
+def mrgSeed(x):
+  # /* -------------------------------------------------------------------
+  #  * Returns the MRG32k3a state for x, which is either a sequence of six
+  #  * integers or a single integer with the conventions of seedValue.
+  #  * -------------------------------------------------------------------
+  #  */
+  if isinstance(x, int):
+    x = seedValue(x)
+    return [x, x, x, x, x, x]
+  s = [int(v) for v in x]
+  if (len(s) != 6) or (min(s) < 0) or (max(s[0:3]) >= M1) or \
+     (max(s[3:6]) >= M2) or (max(s[0:3]) == 0) or (max(s[3:6]) == 0):
+    raise ValueError("invalid MRG32k3a seed {0}".format(x))
+  return s
+
+
+class MRG32k3aStream(BlockStream):
+  # /* ---------------------------------------------------------------------
+  #  * A single MRG32k3a stream.  It remembers where the stream and its
+  #  * current substream started so that either can be restarted.
+  #  * ---------------------------------------------------------------------
+  #  */
+  __slots__ = ('state', 'start', 'substart')
+
+  def __init__(self, x=MRGDEFAULT):
+    self.putSeed(x)
+
+  def random(self):
+    s = self.state
+    p1 = (A12 * s[1] - A13N * s[0]) % M1
+    p2 = (A21 * s[5] - A23N * s[3]) % M2
+    s[0] = s[1]
+    s[1] = s[2]
+    s[2] = p1
+    s[3] = s[4]
+    s[4] = s[5]
+    s[5] = p2
+    if (p1 > p2):
+      return (p1 - p2) * NORM
+    else:
+      return (p1 - p2 + M1) * NORM
+
+  def putSeed(self, x):
+    self.state = mrgSeed(x)
+    self.start = list(self.state)
+    self.substart = list(self.state)
+
+  def getSeed(self):
+    return tuple(self.state)
+
+  def getState(self):
+    return self.state + self.start + self.substart
+
+  def setState(self, state):
+    self.state = list(state[0:6])
+    self.start = list(state[6:12])
+    self.substart = list(state[12:18])
+
+  def resetStream(self):
+    self.substart = list(self.start)
+    self.state = list(self.start)
+
+  def resetSubstream(self):
+    self.state = list(self.substart)
+
+  def nextSubstream(self):
+    self.substart = mrgJumpState(A1P76, A2P76, self.substart)
+    self.state = list(self.substart)
+
+  def selectSubstream(self, r):
+    # /* moves to the start of substream r (0 is the stream's start) */
+    self.substart = mrgJumpState(matPow(A1P76, r, M1), matPow(A2P76, r, M2),
+                                 self.start)
+    self.state = list(self.substart)
+
+  def skip(self, n):
+    a1, a2 = mrgJump(n)
+    self.state = mrgJumpState(a1, a2, self.state)
+
+  def fillArray(self, out):
+    self.state = mrgBlock(self.state, out)
+
+
+def mulMod(a, v, m):
+  # /* a * v mod m for a < 2^32 and an int64 array v < 2^32, split into */
+  # /* 16 bit halves of a so that no product exceeds 2^49               */
+  return ((((a >> 16) * v) % m) * 65536 + (a & 0xFFFF) * v) % m
+
+
+def matVecBlock(a, v, m):
+  return [(mulMod(a[i][0], v[0], m) + mulMod(a[i][1], v[1], m) +
+           mulMod(a[i][2], v[2], m)) % m for i in range(0,3)]
+
+
+def mrgBlock(state, out):
+  # /* ---------------------------------------------------------------------
+  #  * Fills the float64 ndarray out with the random numbers that follow the
+  #  * MRG32k3a state and returns the new state.  The states for the next
+  #  * L = min(BLOCK, n) values are built by doubling (state k + d is A^d
+  #  * applied to state k) and then all L lanes are advanced together by A^L.
+  #  * ---------------------------------------------------------------------
+  #  */
+  n = len(out)
+  if (n == 0):
+    return state
+  size = min(BLOCK, n)
+  first = mrgJumpState(MRGA1, MRGA2, state)
+  x = [numpy.array([v], dtype=numpy.int64) for v in first[0:3]]
+  y = [numpy.array([v], dtype=numpy.int64) for v in first[3:6]]
+  d = 1
+  while (d < size):
+    a1, a2 = mrgJump(d)
+    x = [numpy.concatenate((u, v)) for u, v in zip(x, matVecBlock(a1, x, M1))]
+    y = [numpy.concatenate((u, v)) for u, v in zip(y, matVecBlock(a2, y, M2))]
+    d *= 2
+  x = [v[:size] for v in x]
+  y = [v[:size] for v in y]
+
+  a1, a2 = mrgJump(size)
+  i = 0
+  while (True):
+    c = min(size, n - i)
+    p = x[2][:c] - y[2][:c]
+    p[p <= 0] += M1
+    numpy.multiply(p, NORM, out=out[i:i + c])
+    i += c
+    if (i >= n):
+      break
+    x = matVecBlock(a1, x, M1)
+    y = matVecBlock(a2, y, M2)
+  return [int(v[c - 1]) for v in x] + [int(v[c - 1]) for v in y]
+
+
+class MRG32k3aSet(StreamSet):
+  # /* ---------------------------------------------------------------------
+  #  * A set of MRG32k3a streams with the same interface as StreamSet.
+  #  * Stream j starts j * 2^127 values after the planted seed of stream 0.
+  #  * ---------------------------------------------------------------------
+  #  */
+  __slots__ = ()
+  name = 'mrg32k3a'
+  default = MRGDEFAULT
+  longest = MRGSUBSTREAM
+
+  def __init__(self, count=STREAMS):
+    self.origin = list(MRGDEFAULT)
+    StreamSet.__init__(self, count)
+
+  def resize(self, count):
+    if (count < 1):
+      raise ValueError("the number of streams must be positive")
+    self.separation = MRGSTREAM
+    self.replications = 2 ** 51          #/* substreams of 2^76 values   */
+    self.count = count
+    self.seeds = None
+    self.live = {}
+    newGeneration()
+    self.stream = self.stream % count
+    self.current = self.get(self.stream)
+
+  def plantSeeds(self, x, count=None):
+    if (count is not None) and (count != self.count):
+      self.resize(count)
+    self.initialized = 1
+    self.origin = mrgSeed(x)
+    self.replication = 0
+    for j, s in self.live.items():
+      s.putSeed(self.startOf(j))
+    self.limitCounts(False)
+
+  def selectReplication(self, r, length=None):
+    # /* moves every stream to the start of its substream r; a length */
+    # /* (at most the 2^76 values of a substream) only sets the draws  */
+    # /* that countDraws allows                                        */
+    if (length is not None):
+      self.setLength(length, MRGSUBSTREAM)
+    if (r < 0) or (r >= self.replications):
+      raise ValueError("the replication must be in 0..2^51 - 1")
+    if (self.initialized == 0):
+      self.plantSeeds(self.default)
+    self.replication = r
+    for j, s in self.live.items():
+      s.selectSubstream(r)
+    self.limitCounts(True)
+
+  def newStream(self, index):
+    s = MRG32k3aStream(self.startOf(index))
+    if (self.replication > 0):
+      s.selectSubstream(self.replication)
+    return s
+
+  def startOf(self, index):
+    s = self.origin
+    if (index > 0):
+      s = mrgJumpState(matPow(A1P127, index, M1), matPow(A2P127, index, M2), s)
+    return s
+
+  def getState(self):
+    # /* the planted seed and the replication followed by (index, state, */
+    # /* stream start, substream start) for every stream in use          */
+    state = list(self.origin) + [self.replication]
+    for j, s in sorted(self.live.items()):
+      state += [j] + s.getState()
+    return state
+
+  def setState(self, state):
+    self.origin = list(state[0:6])
+    i = 6
+    if (len(state) % 19 != 6):         #/* a version 1 state has no */
+      self.replication = state[6]      #/* replication              */
+      i = 7
+    for j, s in self.live.items():
+      s.putSeed(self.startOf(j))
+      if (self.replication > 0):
+        s.selectSubstream(self.replication)
+    for i in range(i,len(state),19):
+      self.get(state[i]).setState(state[i + 1:i + 19])
+
+
+# /* -----------------------------------------------------------------------
+#  * Philox4x32-10 is the counter-based generator of
+#  *
+#  *          "Parallel Random Numbers: As Easy as 1, 2, 3"
+#  *            John Salmon, Mark Moraes, Ron Dror, David Shaw
+#  *                          SC11, 2011
+#  *
+#  * Ten rounds of a keyed bijection map a 128-bit counter to four 32-bit
+#  * words, each of which gives one random number (w + 0.5) / 2^32.  Draw i
+#  * of stream s in replication r comes from the counter (i / 4 as 64 bits,
+#  * s, r), so any value can be computed directly, with no state to pass
+#  * from one replication or worker to the next.
+#  * -----------------------------------------------------------------------
+#  */
+PHILOXM0 = 0xD2511F53
+PHILOXM1 = 0xCD9E8D57
+PHILOXW0 = 0x9E3779B9                 #/* key schedule increments */
+PHILOXW1 = 0xBB67AE85
+MASK32 = 0xFFFFFFFF
+TWOM32 = 2.0 ** -32
+
+
+def philox(k0, k1, c0, c1, c2, c3):
+  # /* returns the four words of Philox4x32-10 for key (k0, k1) and */
+  # /* counter (c0, c1, c2, c3)                                     */
+  for r in range(0,10):
+    p0 = PHILOXM0 * c0
+    p1 = PHILOXM1 * c2
+    c0, c1, c2, c3 = ((p1 >> 32) ^ c1 ^ k0, p1 & MASK32,
+                      (p0 >> 32) ^ c3 ^ k1, p0 & MASK32)
+    k0 = (k0 + PHILOXW0) & MASK32
+    k1 = (k1 + PHILOXW1) & MASK32
+  return (c0, c1, c2, c3)
+
+
+def philoxBlock(k0, k1, c0, c1, c2, c3):
+  # /* philox for uint64 arrays c0 and c1 of 32-bit counter words */
+  m0 = numpy.uint64(PHILOXM0)
+  m1 = numpy.uint64(PHILOXM1)
+  low = numpy.uint64(MASK32)
+  shift = numpy.uint64(32)
+  c2 = numpy.full(len(c0), c2, dtype=numpy.uint64)
+  c3 = numpy.full(len(c0), c3, dtype=numpy.uint64)
+  for r in range(0,10):
+    p0 = m0 * c0
+    p1 = m1 * c2
+    c0, c1, c2, c3 = ((p1 >> shift) ^ c1 ^ numpy.uint64(k0), p1 & low,
+                      (p0 >> shift) ^ c3 ^ numpy.uint64(k1), p0 & low)
+    k0 = (k0 + PHILOXW0) & MASK32
+    k1 = (k1 + PHILOXW1) & MASK32
+  return (c0, c1, c2, c3)
+
+
+class CounterStream(BlockStream):
+  # /* ---------------------------------------------------------------------
+  #  * A single Philox stream.  Its state is the index of the next draw;
+  #  * the last block of four words is kept so that only every fourth call
+  #  * evaluates the generator.
+  #  * ---------------------------------------------------------------------
+  #  */
+  __slots__ = ('key', 'stream', 'replication', 'index', 'cached', 'words')
+
+  def __init__(self, key=(DEFAULT, 0), stream=0, replication=0):
+    self.key = key
+    self.stream = stream
+    self.replication = replication
+    self.index = 0
+    self.cached = -1
+    self.words = None
+
+  def random(self):
+    i = self.index
+    self.index = i + 1
+    b = i >> 2
+    if (b != self.cached):
+      self.cached = b
+      self.words = philox(self.key[0], self.key[1], b & MASK32, b >> 32,
+                          self.stream, self.replication)
+    return (self.words[i & 3] + 0.5) * TWOM32
+
+  def restart(self, key, replication):
+    self.key = key
+    self.replication = replication
+    self.index = 0
+    self.cached = -1
+
+  def putSeed(self, x):
+    # /* the 'seed' of a counter stream is the index of its next draw */
+    if (x < 0):
+      raise ValueError("the draw index must be non-negative")
+    self.index = int(x)
+
+  def getSeed(self):
+    return self.index
+
+  def skip(self, n):
+    self.putSeed(self.index + n)
+
+  def fillArray(self, out):
+    n = len(out)
+    i = self.index
+    for start in range(0,n,4 * BLOCK):
+      c = min(4 * BLOCK, n - start)
+      first = (i + start) >> 2
+      last = (i + start + c - 1) >> 2
+      b = numpy.arange(first, last + 1, dtype=numpy.uint64)
+      w = philoxBlock(self.key[0], self.key[1], b & numpy.uint64(MASK32),
+                      b >> numpy.uint64(32), self.stream, self.replication)
+      w = numpy.stack(w, axis=1).reshape(-1)
+      j = (i + start) & 3
+      out[start:start + c] = (w[j:j + c] + 0.5) * TWOM32
+    self.index = i + n
+
+
+class CounterSet(StreamSet):
+  # /* ---------------------------------------------------------------------
+  #  * A set of Philox streams with the same interface as StreamSet plus
+  #  * selectReplication.  plantSeeds(x) sets the key and starts every
+  #  * stream at draw 0; selectReplication(r) moves every stream to the
+  #  * start of replication r.
+  #  * ---------------------------------------------------------------------
+  #  */
+  __slots__ = ('key',)
+  name = 'philox'
+  longest = 2 ** 66
+
+  def __init__(self, count=STREAMS):
+    self.key = (DEFAULT, 0)
+    StreamSet.__init__(self, count)
+
+  def resize(self, count):
+    if (count < 1) or (count > MASK32 + 1):
+      raise ValueError("the number of streams must be in 1..2^32")
+    self.separation = 2 ** 66            #/* 4 values per 64-bit counter */
+    self.replications = MASK32 + 1
+    self.count = count
+    self.seeds = None
+    self.live = {}
+    newGeneration()
+    self.stream = self.stream % count
+    self.current = self.get(self.stream)
+
+  def plantSeeds(self, x, count=None):
+    if (count is not None) and (count != self.count):
+      self.resize(count)
+    self.initialized = 1
+    x = seedValue(x)
+    self.key = (x & MASK32, x >> 32)
+    self.selectReplication(self.replication)
+
+  def selectReplication(self, r, length=None):
+    if (length is not None):
+      self.setLength(length, self.longest)
+    if (r < 0) or (r > MASK32):
+      raise ValueError("the replication must be in 0..2^32 - 1")
+    self.replication = r
+    for j, s in self.live.items():
+      s.restart(self.key, r)
+    self.limitCounts(True)
+
+  def newStream(self, index):
+    return CounterStream(self.key, index, self.replication)
+
+  def getState(self):
+    # /* the key and replication followed by (index, next draw) for every */
+    # /* stream in use                                                    */
+    state = [self.key[0], self.key[1], self.replication]
+    for j, s in sorted(self.live.items()):
+      state += [j, s.getSeed()]
+    return state
+
+  def setState(self, state):
+    self.key = (state[0], state[1])
+    self.selectReplication(state[2])
+    for i in range(3,len(state),2):
+      self.get(state[i]).putSeed(state[i + 1])
+
+
+BACKENDS = {'lehmer': StreamSet, 'mrg32k3a': MRG32k3aSet,
+            'philox': CounterSet}
+STATEMAGIC = b'RNGS'                   #/* save_state file signature   */
+STATEVERSION = 3                       #/* and format version          */
+STATEHEADER = struct.Struct('<4sHBBQQQ')
+STATENAMES = ('lehmer', 'mrg32k3a', 'philox')
+
+
+class CountedStream:
+  # /* ---------------------------------------------------------------------
+  #  * Wraps a stream of any generator and counts the values drawn from it
+  #  * (or skipped) since it was last seeded.  A RuntimeWarning is issued
+  #  * the first time the count passes the separation of the planted seeds,
+  #  * or the length of the replication once one is selected, i.e. when
+  #  * the stream starts to reuse values of the next stream or replication.
+  #  * Only streams of a set with countDraws() on are wrapped, so the
+  #  * counters cost nothing otherwise.
+  #  * ---------------------------------------------------------------------
+  #  */
+  __slots__ = ('source', 'index', 'limit', 'draws')
+
+  def __init__(self, source, index, limit):
+    self.source = source
+    self.index = index
+    self.limit = limit
+    self.draws = 0
+
+  def random(self):
+    self.draws += 1
+    if (self.draws > self.limit):
+      self.overlap()
+    return self.source.random()
+
+  def overlap(self):
+    warnings.warn("stream {0} has drawn {1} values and now overlaps the "
+                  "next stream or replication".format(self.index, self.draws),
+                  RuntimeWarning, stacklevel=3)
+    self.limit = float('inf')                #/* warn only once */
+
+  def count(self, n):
+    self.draws += n
+    if (self.draws > self.limit):
+      self.overlap()
+
+  def putSeed(self, x):
+    self.source.putSeed(x)
+    self.draws = 0
+
+  def getSeed(self):
+    return self.source.getSeed()
+
+  def fill(self, buffer):
+    self.source.fill(buffer)
+    self.count(len(buffer))
+    return buffer
+
+  def block(self, n):
+    u = self.source.block(n)
+    self.count(n)
+    return u
+
+  def skip(self, n):
+    self.source.skip(n)
+    self.count(n)
+
+  def restart(self, *args):
+    self.source.restart(*args)
+    self.draws = 0
+
+  def resetStream(self):
+    self.source.resetStream()
+    self.draws = 0
+
+  def selectSubstream(self, r):
+    self.source.selectSubstream(r)
+    self.draws = 0
+
+  def __getattr__(self, name):               #/* e.g. nextSubstream */
+    return getattr(self.source, name)
+
+
+class AntitheticStream:
+  # /* ---------------------------------------------------------------------
+  #  * Wraps a stream of any generator and returns 1 - u for each value u
+  #  * of the stream, so a replication run with antithetic() on is the
+  #  * antithetic partner of the same replication run with it off.
+  #  * ---------------------------------------------------------------------
+  #  */
+  __slots__ = ('source',)
+
+  def __init__(self, source):
+    self.source = source
+
+  def random(self):
+    return 1.0 - self.source.random()
+
+  def fill(self, buffer):
+    self.source.fill(buffer)
+    if (numpy is not None) and (not isinstance(buffer, list)):
+      out = numpy.asarray(buffer)
+      numpy.subtract(1.0, out, out=out)
+    else:
+      for i in range(0,len(buffer)):
+        buffer[i] = 1.0 - buffer[i]
+    return buffer
+
+  def block(self, n):
+    u = self.source.block(n)
+    if (numpy is not None):
+      return 1.0 - numpy.asarray(u)
+    return array('d', [1.0 - t for t in u])
+
+  def __getattr__(self, name):               #/* getSeed, skip, ... */
+    return getattr(self.source, name)
+
+
+class BufferedStream:
+  # /* ---------------------------------------------------------------------
+  #  * Wraps a stream of any generator and serves its values from a buffer
+  #  * that is refilled size values at a time by the stream's vectorized
+  #  * block method.  The method random is the __next__ of an iterator over
+  #  * the buffers, so a draw involves no Python code until a refill.
+  #  *
+  #  * Before the state of the stream is read or changed the buffer is
+  #  * flushed: the stream is moved back by the number of values still in
+  #  * the buffer, so getSeed(), putSeed() and the other methods see the
+  #  * stream exactly as if it had not been buffered.  Flushing empties the
+  #  * buffer in place, so random stays the same iterator and a bound
+  #  * stream.random taken earlier goes on to the values after the flush.
+  #  * ---------------------------------------------------------------------
+  #  */
+  __slots__ = ('source', 'size', 'values', 'random')
+
+  def __init__(self, source, size=PREFETCH):
+    self.source = source
+    self.size = size
+    self.values = iter(())
+    self.random = chain.from_iterable(self.refills()).__next__
+
+  def refills(self):
+    while (True):
+      self.values = iter(self.source.block(self.size).tolist())
+      yield self.values
+
+  def discard(self):
+    # /* drops the buffer without moving the stream back; the iterator */
+    # /* is run to its end so that the next draw refills               */
+    deque(self.values, maxlen=0)
+
+  def flush(self):
+    n = length_hint(self.values)
+    if (n > 0):
+      self.source.skip(-n)
+    self.discard()
+
+  def putSeed(self, x):
+    self.discard()
+    self.source.putSeed(x)
+
+  def getSeed(self):
+    self.flush()
+    return self.source.getSeed()
+
+  def __getattr__(self, name):               #/* fill, block, skip, ... */
+    self.flush()
+    return getattr(self.source, name)
+
+
+streams = StreamSet()                  #/* the default set of streams */
+if (os.environ.get('RNGS_PREFETCH')):  #/* prefetch without code changes */
+  streams.prefetch(int(os.environ['RNGS_PREFETCH']))
 
 
 def random(): 
   #/* ---------------------------------------------------------------------
-  #* Random is a Lehmer generator that returns a pseudo-random real number
-  #* uniformly distributed between 0.0 and 1.0.  The period is (m - 1)
-  #* where m = 2,147,483,647 amd the smallest and largest possible values
-  #* are (1 / m) and 1 - (1 / m) respectively.
+  #* Returns the next random number from the current stream of the default
+  #* set -- see Stream.random.
   #* ---------------------------------------------------------------------
   #*/
-  global seed
+  return streams.current.random()
 
-  Q = int(MODULUS / MULTIPLIER)
-  R = int(MODULUS % MULTIPLIER)
+def random_block(n, stream=None):
+  # /* ---------------------------------------------------------------------
+  #  * Returns the next n random numbers of a stream (the current stream by
+  #  * default) and advances that stream exactly as n calls to random()
+  #  * would.  The current stream is not changed.
+  #  * ---------------------------------------------------------------------
+  #  */
+  return streams.get(stream).block(n)
 
-  t = int(MULTIPLIER * (seed[stream] % Q) - R * int(seed[stream] / Q))
-  if (t > 0):
-    seed[stream] = int(t)
-  else:
-    seed[stream] = int(t + MODULUS)
 
-  return float(seed[stream] / MODULUS)
+def fill(buffer, stream=None):
+  # /* ---------------------------------------------------------------------
+  #  * Overwrites every element of buffer (an ndarray, array('d') or list)
+  #  * in place with the next len(buffer) random numbers of a stream.
+  #  * ---------------------------------------------------------------------
+  #  */
+  return streams.get(stream).fill(buffer)
+
+
+def lehmerPowers():
+  # /* returns the int64 ndarray a^1,...,a^BLOCK mod m, built once by */
+  # /* doubling                                                         */
+  global powers
+
+  if (powers is None):
+    p = numpy.array([MULTIPLIER], dtype=numpy.int64)
+    while (len(p) < BLOCK):
+      p = numpy.concatenate((p, p * p[-1] % MODULUS))
+    powers = p[:BLOCK]
+  return powers
+
+
+def lehmerBlock(x, out):
+  # /* ---------------------------------------------------------------------
+  #  * Fills the float64 ndarray out with the random numbers that follow the
+  #  * state x and returns the new state.  The states are x * a^k mod m for
+  #  * k = 1,2,...; every product is less than 2^62 so int64 is exact.
+  #  * ---------------------------------------------------------------------
+  #  */
+  p = lehmerPowers()
+  n = len(out)
+  i = 0
+  while (i < n):
+    c = min(BLOCK, n - i)
+    s = p[:c] * x % MODULUS
+    numpy.divide(s, MODULUS, out=out[i:i + c])
+    x = int(s[-1])
+    i += c
+  return x
+
+
+def skip(n, stream=None):
+  # /* ---------------------------------------------------------------------
+  #  * Advances a stream (the current stream by default) by n calls to
+  #  * random() without generating them.  The current stream is not changed.
+  #  * ---------------------------------------------------------------------
+  #  */
+  streams.get(stream).skip(n)
+
 
-def plantSeeds(x): 
+def plantSeeds(x, count=None): 
   # /* --------------------------------------------------------------------
-  #  * Use this function to set the state of all the random number generator
-  #  * streams by "planting" a sequence of states (seeds), one per stream,
-  #  * with all states dictated by the state of the default stream.
-  #  * The sequence of planted states is separated one from the next by
-  #  * 8,367,782 calls to Random().
+  #  * Plants the seeds of every stream of the default set, changing the
+  #  * number of streams to count if it is given -- see StreamSet.plantSeeds.
   #  * ---------------------------------------------------------------------
   #  */
-  global initialized
-  global stream
-  global seed
+  streams.plantSeeds(x, count)
 
-  Q = int(MODULUS / A256)
-  R = int(MODULUS % A256)
 
-  initialized = 1
-  s = stream                             #/* remember the current stream */
-  selectStream(0)                        #/* change to stream 0          */
-  putSeed(x)                             #/* set seed[0]                 */
-  stream = s                             #/* reset the current stream    */
-  for j in range(1,STREAMS):
-    x = int(A256 * (seed[j - 1] % Q) - R * int((seed[j - 1] / Q)))
-    if (x > 0):
-      seed[j] = x
-    else:
-      seed[j] = x + MODULUS
-  
+def separation():
+  # /* --------------------------------------------------------------------
+  #  * Returns the number of calls to random() that separate the planted
+  #  * seeds of the default set, i.e. how many values each stream may use
+  #  * before it is guaranteed not to overlap the next one.
+  #  * ---------------------------------------------------------------------
+  #  */
+  return streams.separation
 
-def putSeed(x):
+
+def replications():
+  # /* --------------------------------------------------------------------
+  #  * Returns the number of replications selectReplication offers with the
+  #  * default set: separation() // length for the Lehmer streams.
+  #  * ---------------------------------------------------------------------
+  #  */
+  return streams.replications
+
+
+def useBackend(name, count=STREAMS):
+  # /* --------------------------------------------------------------------
+  #  * Replaces the default set of streams by a new set from the named
+  #  * generator ('lehmer', 'mrg32k3a' or 'philox') and returns it.  The
+  #  * module level functions, and so rvgs, then draw from the new set.
+  #  * ---------------------------------------------------------------------
+  #  */
+  global streams
+
+  if (name not in BACKENDS):
+    raise ValueError("unknown generator {0!r}, use one of {1}".format(
+                     name, sorted(BACKENDS)))
+  streams = BACKENDS[name](count)
+  return streams
+
+
+def countDraws(enable=True, report=False):
+  # /* --------------------------------------------------------------------
+  #  * Switches the per-stream draw counters of the default set on or off.
+  #  * With report=True the counts are also printed when the program exits.
+  #  * ---------------------------------------------------------------------
+  #  */
+  streams.countDraws(enable)
+  if (report):
+    atexit.unregister(reportDraws)
+    atexit.register(reportDraws)
+
+
+def prefetch(size=PREFETCH):
+  # /* --------------------------------------------------------------------
+  #  * Makes every stream of the default set prefetch its values size at a
+  #  * time (0 switches this off) -- see StreamSet.prefetch.  Programs that
+  #  * call random() one value at a time then run faster without changes.
+  #  * ---------------------------------------------------------------------
+  #  */
+  streams.prefetch(size)
+
+
+def drawCounts():
+  # /* returns {stream index: draws} for the default set */
+  return streams.drawCounts()
+
+
+def reportDraws():
+  # /* --------------------------------------------------------------------
+  #  * Prints the number of values drawn from each counted stream of the
+  #  * default set as a fraction of the separation of the planted seeds, or
+  #  * of the replication length once a replication is selected.
+  #  * ---------------------------------------------------------------------
+  #  */
+  limit = streams.countLimit()
+  print("\n  stream         draws   of {0}".format(
+        "replication" if (streams.selected) else "separation"))
+  for j, n in drawCounts().items():
+    flag = "  OVERLAP" if (n > limit) else ""
+    print("  {0:6d} {1:13d}   {2:12.6%}{3}".format(j, n, n / limit, flag))
+
+
+def get_state():
+  # /* --------------------------------------------------------------------
+  #  * Returns the whole state of the default set -- generator, number of
+  #  * streams, current stream, whether the seeds have been planted, the
+  #  * state of every stream and whether the streams are antithetic -- as a
+  #  * tuple that set_state accepts.
+  #  * ---------------------------------------------------------------------
+  #  */
+  return (streams.name, streams.count, streams.stream, streams.initialized,
+          tuple(streams.getState()), streams.flipped)
+
+
+def set_state(state):
+  # /* --------------------------------------------------------------------
+  #  * Restores a state returned by get_state.  The default set is only
+  #  * replaced if the generator or the number of streams differs, so
+  #  * Stream objects already handed out keep drawing from the restored state.
+  #  * A state saved before the antithetic flag was kept leaves it off.
+  #  * ---------------------------------------------------------------------
+  #  */
+  global streams
+
+  name, count, stream, initialized, values = state[0:5]
+  flipped = state[5] if (len(state) > 5) else False
+  if (streams.name != name) or (streams.count != count):
+    streams = BACKENDS[name](count)
+  if (streams.flipped != flipped):
+    streams.antithetic(flipped)
+  streams.initialized = initialized
+  streams.setState(list(values))
+  streams.selectStream(stream)
+
+
+def save_state(path):
+  # /* --------------------------------------------------------------------
+  #  * Writes get_state() to a file: a little-endian header (signature,
+  #  * version, generator, flags -- 1 if initialized, 2 if antithetic --,
+  #  * number of streams, current stream, number of values) followed by the
+  #  * values as unsigned 64-bit integers.  The file is replaced atomically,
+  #  * so a run that is stopped while checkpointing leaves the previous
+  #  * checkpoint intact.
+  #  * ---------------------------------------------------------------------
+  #  */
+  name, count, stream, initialized, values, flipped = get_state()
+  flags = (1 if initialized else 0) | (2 if flipped else 0)
+  header = STATEHEADER.pack(STATEMAGIC, STATEVERSION, STATENAMES.index(name),
+                            flags, count, stream, len(values))
+  temp = "{0}.tmp".format(path)
+  with open(temp, 'wb') as f:
+    f.write(header)
+    f.write(struct.pack('<{0}Q'.format(len(values)), *values))
+  os.replace(temp, path)
+
+
+def load_state(path):
+  # /* --------------------------------------------------------------------
+  #  * Restores the default set from a file written by save_state.
+  #  * ---------------------------------------------------------------------
+  #  */
+  with open(path, 'rb') as f:
+    data = f.read()
+  if (len(data) < STATEHEADER.size):
+    raise ValueError("{0} is not an rngs state file".format(path))
+  magic, version, name, flags, count, stream, n = \
+    STATEHEADER.unpack_from(data)
+  if (magic != STATEMAGIC):
+    raise ValueError("{0} is not an rngs state file".format(path))
+  if (version not in (1, 2, STATEVERSION)):
+    raise ValueError("unsupported rngs state version {0}".format(version))
+  if (len(data) != STATEHEADER.size + 8 * n):
+    raise ValueError("{0} is truncated".format(path))
+  values = struct.unpack_from('<{0}Q'.format(n), data, STATEHEADER.size)
+  set_state((STATENAMES[name], count, stream, flags & 1, values,
+             flags & 2 != 0))
+
+
+def selectReplication(r, length=None):
+  # /* --------------------------------------------------------------------
+  #  * Moves every stream of the default set to the start of replication r:
+  #  * a share of length values (REPLICATION unless given) of each stream's
+  #  * segment for the Lehmer streams (r less than replications()),
+  #  * substream r for MRG32k3a and replication r for Philox.  Runs that
+  #  * start from the same replication draw the same values from each
+  #  * stream, whatever the others consume.
+  #  * ---------------------------------------------------------------------
+  #  */
+  streams.selectReplication(r, length)
+
+
+def antithetic(enable=True):
+  # /* --------------------------------------------------------------------
+  #  * Makes every stream of the default set return 1 - u in place of u
+  #  * (enable=False switches this off) -- see AntitheticStream.
+  #  * ---------------------------------------------------------------------
+  #  */
+  streams.antithetic(enable)
+
+
+def replicate(run, scenarios, replications, seed=None, antithetic=False,
+              length=None):
+  # /* --------------------------------------------------------------------
+  #  * Returns [[run(s) for each replication] for s in scenarios], with
+  #  * the default set planted with seed (its generator's default seed if
+  #  * None) and moved to the start of replication r, and stream 0
+  #  * selected, before run(s) is called for replication r of every
+  #  * scenario.  As long as run uses one stream per purpose (arrivals on
+  #  * stream 0, services on stream 1, ...) the scenarios then see common
+  #  * random numbers, and pairedDifference gives the variance of their
+  #  * difference.  With antithetic=True each result is the mean of run(s)
+  #  * and of run(s) repeated with antithetic values.  length sets the
+  #  * values each stream may draw per replication (see selectReplication);
+  #  * a run that may draw more than REPLICATION from a Lehmer stream must
+  #  * give it.  run must not plant the seeds itself.
+  #  * ---------------------------------------------------------------------
+  #  */
+  if (seed is None):
+    seed = streams.default
+  plantSeeds(seed)
+  selectReplication(0, length)
+  if (replications > streams.replications):
+    raise ValueError("only {0} replications are available".format(
+                     streams.replications))
+  results = [[] for s in scenarios]
+  for r in range(0,replications):
+    for k, s in enumerate(scenarios):
+      selectReplication(r)
+      selectStream(0)
+      x = run(s)
+      if (antithetic):
+        selectReplication(r)
+        selectStream(0)
+        previous = streams.flipped       #/* the pair of a run that was */
+        streams.antithetic(not previous) #/* already antithetic is the  */
+        try:                             #/* plain run                  */
+          x = 0.5 * (x + run(s))
+        finally:
+          streams.antithetic(previous)
+      results[k].append(x)
+  return results
+
+
+def pairedDifference(x, y):
+  # /* --------------------------------------------------------------------
+  #  * Returns (mean, variance, independent) for the differences x[i] - y[i]
+  #  * of paired replications: their mean and variance, and the variance
+  #  * var(x) + var(y) the difference would have without the pairing.  The
+  #  * number of replications needed for a given interval width is reduced
+  #  * by the factor independent / variance.  Uses Welford's one-pass method
+  #  * and the divisor n, as program estimate does.
+  #  * ---------------------------------------------------------------------
+  #  */
+  if (len(x) != len(y)) or (len(x) == 0):
+    raise ValueError("pairedDifference needs two samples of the same size")
+  n = 0
+  mean = [0.0, 0.0, 0.0]
+  sum = [0.0, 0.0, 0.0]
+  for a, b in zip(x, y):
+    n += 1
+    for k, v in enumerate((a - b, a, b)):
+      diff = v - mean[k]
+      sum[k] += diff * diff * (n - 1.0) / n
+      mean[k] += diff / n
+  return (mean[0], sum[0] / n, (sum[1] + sum[2]) / n)
+
+
+def seedValue(x):
   # /* -------------------------------------------------------------------
-  #  * Use this (optional) procedure to initialize or reset the state of
-  #  * the random number generator according to the following conventions:
+  #  * Returns the state that corresponds to x according to the following
+  #  * conventions:
   #  *    if x > 0 then x is the initial seed (unless too large)
   #  *    if x < 0 then the initial seed is obtained from the system clock
   #  *    if x = 0 then the initial seed is to be supplied interactively
   #  * --------------------------------------------------------------------
   #  */
-  global seed 
-
   ok = False
 
   if (x > 0):
@@ -131,8 +1569,16 @@ def putSeed(x):
       if (ok == False):
         print("\nInput out of range ... try again\n")
     
-    
-  seed[stream] = int(x)
+  return int(x)
+
+
+def putSeed(x):
+  # /* -------------------------------------------------------------------
+  #  * Use this (optional) procedure to initialize or reset the state of
+  #  * the current stream -- see seedValue for the conventions on x.
+  #  * --------------------------------------------------------------------
+  #  */
+  streams.putSeed(x)
 
 
 def getSeed():
@@ -141,7 +1587,7 @@ def getSeed():
   #  * number generator.
   #  * --------------------------------------------------------------------
   #  */
-  return seed[stream]
+  return streams.getSeed()
 
 
 def selectStream(index):
@@ -150,12 +1596,7 @@ def selectStream(index):
   #* stream -- that stream from which the next random number will come.
   #* ------------------------------------------------------------------
   #*/
-  global stream 
-
-  stream = index % STREAMS
-  if (initialized == 0) and (stream != 0):   #/* protect against        */
-    plantSeeds(DEFAULT)                     #/* un-initialized streams */
-    
+  streams.selectStream(index)
 
 
   
@@ -173,7 +1614,114 @@ def testRandom():
     u = random()
   x = getSeed()                    #/* get the new state value   */
   ok = (x == CHECK)                #/* and check for correctness */
-  
+
+  putSeed(1)                       #/* the block generator must  */
+  random_block(10000)              #/* reach the same state      */
+  ok = (ok==True) and (getSeed() == CHECK)
+
+  putSeed(1)                       #/* and so must a skip ahead  */
+  skip(10000)
+  ok = (ok==True) and (getSeed() == CHECK)
+  ok = (ok==True) and (jump_multiplier(8367782) == A256)
+
+  other = StreamSet()              #/* an independent set of streams */
+  other.putSeed(1)                 #/* drawn from by a bound method  */
+  draw = other.get(0).random
+  for i in range(0,10000):
+    u = draw()
+  ok = (ok==True) and (other.getSeed() == CHECK)
+
+  other.plantSeeds(1, 1000)        #/* with 1000 streams seed[k] must */
+  x = other.get(999).getSeed()     #/* be a^(k * separation) mod m    */
+  ok = (ok==True) and (x == jump_multiplier(999 * other.separation))
+
+  other = MRG32k3aSet()            #/* MRG32k3a must reproduce the */
+  other.plantSeeds(MRGDEFAULT)     #/* RngStreams stream seeds     */
+  ok = (ok==True) and (other.get(1).getSeed() == MRGCHECK)
+  u = other.get(1).block(1000)     #/* and its block path must     */
+  other.get(1).resetStream()       #/* match the scalar one        */
+  ok = (ok==True) and (list(u) == [other.get(1).random() for i in range(0,1000)])
+
+  x = philox(0xA4093822, 0x299F31D0,         #/* Random123 known answer */
+             0x243F6A88, 0x85A308D3, 0x13198A2E, 0x03707344)
+  ok = (ok==True) and (x == (0xD16CFE09, 0x94FDCCEB, 0x5001E420, 0x24126EA1))
+  other = CounterSet()
+  other.plantSeeds(1)
+  other.selectReplication(3)
+  u = other.get(5).block(1001)
+  other.selectReplication(3)
+  ok = (ok==True) and (list(u) == [other.get(5).random() for i in range(0,1001)])
+
+  other = StreamSet()              #/* an antithetic stream returns */
+  other.plantSeeds(1)              #/* 1 - u in place of u          */
+  u = other.get(2).block(100)
+  other.plantSeeds(1)
+  other.antithetic(True)
+  ok = (ok==True) and ([1.0 - t for t in u] == [other.get(2).random() for i in range(0,100)])
+
+  for other in (StreamSet(), MRG32k3aSet()):  #/* a replication starts at */
+    other.plantSeeds(1)                       #/* the same values however */
+    other.selectReplication(5)                #/* far the streams ran     */
+    u = other.get(3).block(10)
+    other.get(3).skip(777)
+    other.selectReplication(5)
+    ok = (ok==True) and (list(u) == list(other.get(3).block(10)))
+  other = StreamSet()
+  other.plantSeeds(1)
+  other.selectReplication(1)
+  x = other.get(0).getSeed()
+  ok = (ok==True) and (x == jump_multiplier(REPLICATION))
+  other.selectReplication(other.replications - 1)
+  state = other.getState()         #/* the replication is checkpointed */
+  other.plantSeeds(2)
+  other.setState(state)
+  other.selectReplication(0)
+  ok = (ok==True) and (other.get(0).getSeed() == seedValue(1))
+  other.selectReplication(1, 3 * REPLICATION)  #/* a longer replication */
+  x = other.get(0).getSeed()                   #/* starts further on    */
+  ok = (ok==True) and (x == jump_multiplier(3 * REPLICATION))
+  other.countDraws(True)                       #/* and bounds the count  */
+  ok = (ok==True) and (other.get(0).limit == 3 * REPLICATION)
+  other.plantSeeds(1)
+  ok = (ok==True) and (other.get(0).limit == other.separation)
+
+  other = StreamSet()              #/* a prefetched stream must give */
+  other.plantSeeds(1)              #/* the unbuffered sequence when  */
+  u = other.get(2).block(200)      #/* a bound random is mixed with  */
+  other.plantSeeds(1)              #/* block draws                   */
+  other.prefetch(64)
+  s = other.get(2)
+  draw = s.random
+  x = [draw()] + list(s.block(3)) + [draw() for i in range(0,100)]
+  x += list(s.block(90)) + [draw() for i in range(0,6)]
+  ok = (ok==True) and (x == list(u))
+
+  for other in (StreamSet(), MRG32k3aSet(), CounterSet()):
+    if (numpy is not None):        #/* a strided view is filled in */
+      other.plantSeeds(1)          #/* place                       */
+      u = other.get(0).block(20)
+      other.plantSeeds(1)
+      a = numpy.zeros((10, 3))
+      other.get(0).fill(a[:, :2])
+      ok = (ok==True) and (list(a[:, :2].reshape(-1)) == list(u))
+      ok = (ok==True) and (not a[:, 2].any())
+
+  state = get_state()              #/* a restored state must repeat */
+  u = random_block(100)            #/* the same values              */
+  set_state(state)
+  ok = (ok==True) and (list(u) == [random() for i in range(0,100)])
+  antithetic(True)                 #/* and keep the antithetic flag */
+  selectReplication(2, 1000)       #/* and replication length       */
+  state = get_state()
+  u = random_block(100)
+  antithetic(False)
+  selectReplication(0, REPLICATION)
+  set_state(state)
+  ok = (ok==True) and (list(u) == [random() for i in range(0,100)])
+  ok = (ok==True) and (streams.length == 1000)
+  antithetic(False)
+  selectReplication(0, REPLICATION)
+
   selectStream(1)                  #/* select stream 1                 */
   plantSeeds(1)                    #/* set the state of all streams    */
   x = getSeed()                    #/* get the state of stream 1       */
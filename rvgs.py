@@ -33,17 +33,98 @@
  #Translated by     : Philip Steele 
  #Language          : Python 3.3
  #Latest Revision   : 3/26/14
+ #
+ #Every generator also accepts size=n and then returns a NumPy array of n
+ #variates (a list if NumPy is not installed).  The array is built from a
+ #block of uniforms drawn from the current stream, taken in the same order
+ #as n scalar calls would take them, so the stream is left in the same
+ #state.  The values agree with the scalar ones up to the rounding of
+ #NumPy's log, exp and sqrt, which may differ from the math module's in
+ #the last bit.
  # 
  #--------------------------------------------------------------------------
 
-from rngs import random
-from math import log,sqrt,exp
+from rngs import random, random_block, skip
+import rngs
+import rvms
+from math import log,sqrt,exp,floor,lgamma
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import chain, accumulate
+from array import array
+from hashlib import sha1
+import getpass
+import mmap
+import os
+import tempfile
+
+try:
+  import numpy
+except ImportError:                    # size=n falls back to n scalar calls
+  numpy = None
+
+POISSONPTRS = 10.0                     # Poisson(m, method='fast') uses PTRS
+                                       # for m >= POISSONPTRS
+ERLANGGAMMA = 16                       # and Erlang(n, b, method='fast') a
+                                       # gamma variate for n >= ERLANGGAMMA
+PASCALTABLE = 10000.0                  # Pascal(n, p, method='fast') inverts
+                                       # a cdf table below this mean
+ZIGLAYERS = 128                        # layers of the Normal ziggurat, the
+ZIGTAIL = 3.442619855899               # start of its tail
+ZIGAREA = 9.91256303526217e-3          # and the area of each layer
+INVERSIONLIMIT = 65536                 # most table entries for dist.Inversion
+INVERSIONTAIL = 2.0 ** -16             # which uses the exact idf for u this
+                                       # close to 0 or 1
+TAPEBUDGET = 2 ** 30                   # bytes of tapes a TapeCache keeps
+BLOCKTAPE = 65536                      # and the variates it first records
+ARRIVALBLOCK = 1024                    # gaps an ArrivalProcess draws at once
+TAPEDIR = os.environ.get('RVGS_TAPES') or os.path.join(tempfile.gettempdir(),
+          'rvgs-tapes-{0}'.format(os.getuid() if hasattr(os, 'getuid')
+                                  else getpass.getuser()))
+
+def uniforms(n, k=None, stream=None):
+  #==================================================================
+  #Returns the next n uniforms of a stream (the current stream by
+  #default) as a vector or, if k is given, the next n * k as an n by k
+  #array, row i holding those of the i-th variate.
+  #==================================================================
+  if (k is None):
+    return numpy.asarray(random_block(n, stream))
+  return numpy.asarray(random_block(n * k, stream)).reshape(n, k)
 
-def Bernoulli(p):
+def rows(f, size, k):
+  #==================================================================
+  #size=n for a generator that takes k uniforms per variate: f maps a
+  #c by k array of uniforms to their c variates, and is called on about
+  #rngs.BLOCK uniforms at a time so that memory does not grow with n * k.
+  #==================================================================
+  c = max(1, rngs.BLOCK // k)
+  if (size <= c):
+    return f(uniforms(size, k))
+  return numpy.concatenate([f(uniforms(min(c, size - i), k))
+                            for i in range(0,size,c)])
+
+def scalars(f, size, *args):
+  #size=n by n scalar calls, for generators without a vectorized form
+  x = [f(*args) for i in range(0,size)]
+  if (numpy is None):
+    return x
+  return numpy.array(x)
+
+def checkMethod(method, methods):
+  if (method not in methods):
+    raise ValueError("unknown method {0!r}, use one of {1}".format(
+                     method, methods))
+
+def Bernoulli(p, size=None):
   #========================================================
   #Returns 1 with probability p or 0 with probability 1 - p. 
   #NOTE: use 0.0 < p < 1.0                                   
   #========================================================
+  if (size is not None):
+    if (numpy is None):
+      return scalars(Bernoulli, size, p)
+    return (uniforms(size) >= 1 - p).astype(numpy.int64)
   
   if (random() < 1 - p):
     return(0)
@@ -51,11 +132,26 @@ def Bernoulli(p):
     return(1)
 
 
-def Binomial(n,p):
+def Binomial(n,p,size=None,method='legacy'):
   #================================================================ 
   #Returns a binomial distributed integer between 0 and n inclusive. 
   #NOTE: use n > 0 and 0.0 < p < 1.0
+  #
+  #method='legacy' sums n Bernoulli variates, as the textbook programs
+  #do.  method='fast' takes O(1) expected time: inversion when
+  #n * min(p, 1 - p) < 30 and otherwise the BTPE algorithm of
+  #Kachitvichyanukul & Schmeiser, Comm. ACM, 1988, vol 31, pp 216-222.
   #================================================================
+  if (method != 'legacy'):
+    checkMethod(method, ('legacy', 'fast'))
+    if (size is not None):
+      return scalars(BinomialFast, size, n, p)
+    return BinomialFast(n, p)
+  if (size is not None):
+    if (numpy is None):
+      return scalars(Binomial, size, n, p)
+    return rows(lambda u: (u >= 1 - p).sum(axis=1, dtype=numpy.int64),
+                size, n)
   
   x = 0
 
@@ -63,29 +159,184 @@ def Binomial(n,p):
     x += Bernoulli(p)
   return (x)
 
-def Equilikely(a,b):
+def BinomialFast(n,p):
+  #Binomial(n, p, method='fast'), see above
+  r = min(p, 1.0 - p)
+  if (n * r < 30.0):
+    x = BinomialInversion(n, r)
+  else:
+    x = BinomialBTPE(n, r)
+  if (p > 0.5):
+    return (n - x)
+  return (x)
+
+def BinomialInversion(n,p):
+  #================================================================
+  #Sequential search of the binomial cdf from 0, for n * p < 30 and
+  #p <= 0.5.  Searches that pass a bound far in the tail restart.
+  #================================================================
+  q = 1.0 - p
+  qn = exp(n * log(q))
+  bound = min(n, n * p + 10.0 * sqrt(n * p * q + 1))
+  x = 0
+  px = qn
+  u = random()
+  while (u > px):
+    x += 1
+    if (x > bound):
+      x = 0
+      px = qn
+      u = random()
+    else:
+      u -= px
+      px = ((n - x + 1) * p * px) / (x * q)
+  return (x)
+
+def BinomialBTPE(n,p):
+  #================================================================
+  #The BTPE (Binomial, Triangle, Parallelogram, Exponential) rejection
+  #algorithm for n * p >= 30 and p <= 0.5; two uniforms per trial and
+  #about 1.1 trials per variate.
+  #================================================================
+  q = 1.0 - p
+  nrq = n * p * q
+  fm = n * p + p
+  m = int(fm)
+  p1 = int(2.195 * sqrt(nrq) - 4.6 * q) + 0.5
+  xm = m + 0.5
+  xl = xm - p1
+  xr = xm + p1
+  c = 0.134 + 20.5 / (15.3 + m)
+  a = (fm - xl) / (fm - xl * p)
+  laml = a * (1.0 + a / 2.0)
+  a = (xr - fm) / (xr * q)
+  lamr = a * (1.0 + a / 2.0)
+  p2 = p1 * (1.0 + 2.0 * c)
+  p3 = p2 + c / laml
+  p4 = p3 + c / lamr
+
+  while (True):
+    u = random() * p4
+    v = random()
+    if (u <= p1):                        # triangular region: accept
+      return (int(xm - p1 * v + u))
+    if (u <= p2):                        # parallelograms
+      x = xl + (u - p1) / c
+      v = v * c + 1.0 - abs(m - x + 0.5) / p1
+      if (v > 1.0):
+        continue
+      y = int(x)
+    elif (u <= p3):                      # left exponential tail
+      if (v == 0.0):
+        continue
+      y = floor(xl + log(v) / laml)
+      if (y < 0):
+        continue
+      v = v * (u - p2) * laml
+    else:                                # right exponential tail
+      if (v == 0.0):
+        continue
+      y = int(xr - log(v) / lamr)
+      if (y > n):
+        continue
+      v = v * (u - p3) * lamr
+
+    k = abs(y - m)
+    if (k <= 20) or (k >= nrq / 2.0 - 1):
+      s = p / q                          # evaluate f(y) / f(m) directly
+      a = s * (n + 1)
+      f = 1.0
+      if (m < y):
+        for i in range(m + 1,y + 1):
+          f *= (a / i - s)
+      elif (m > y):
+        for i in range(y + 1,m + 1):
+          f /= (a / i - s)
+      if (v <= f):
+        return (y)
+      continue
+
+    rho = (k / nrq) * ((k * (k / 3.0 + 0.625) + 0.16666666666666666) / nrq + 0.5)
+    t = -k * k / (2.0 * nrq)
+    A = log(v)                           # squeeze, then Stirling bound
+    if (A < t - rho):
+      return (y)
+    if (A > t + rho):
+      continue
+    x1 = y + 1.0
+    f1 = m + 1.0
+    z = n + 1.0 - m
+    w = n - y + 1.0
+    if (A <= xm * log(f1 / x1) + (n - m + 0.5) * log(z / w) +
+             (y - m) * log(w * p / (x1 * q)) + Stirling(f1) + Stirling(z) +
+             Stirling(x1) + Stirling(w)):
+      return (y)
+
+def Stirling(x):
+  #the correction term of Stirling's formula used by BTPE
+  x2 = x * x
+  return ((13860.0 - (462.0 - (132.0 - (99.0 - 140.0 / x2) / x2) / x2) / x2)
+          / x / 166320.0)
+
+def Equilikely(a,b,size=None):
   #===================================================================
   #Returns an equilikely distributed integer between a and b inclusive. 
   #NOTE: use a < b
   #===================================================================
+  if (size is not None):
+    if (numpy is None):
+      return scalars(Equilikely, size, a, b)
+    return a + ((b - a + 1) * uniforms(size)).astype(numpy.int64)
   return (a + int((b - a + 1) * random()))
 
-def Geometric(p):
+def Geometric(p, size=None):
   #====================================================
   #Returns a geometric distributed non-negative integer.
   #NOTE: use 0.0 < p < 1.0
   #====================================================
   #
+  if (size is not None):
+    if (numpy is None):
+      return scalars(Geometric, size, p)
+    return (numpy.log(1.0 - uniforms(size)) / log(p)).astype(numpy.int64)
 
   return (int(log(1.0 - random()) / log(p)))
 
 
-def Pascal(n,p):
+def Pascal(n,p,size=None,method='legacy'):
   #================================================= 
   #Returns a Pascal distributed non-negative integer. 
   #NOTE: use n > 0 and 0.0 < p < 1.0
+  #
+  #method='legacy' adds n Geometric variates.  method='fast' inverts a
+  #cached table of the cdf (the values of rvms.cdfPascal, one uniform per
+  #variate) when the mean n*p/(1-p) is below PASCALTABLE, and otherwise
+  #draws a Poisson variate whose mean is a Gamma(n) variate scaled by
+  #p/(1-p).  Neither costs more for larger n.
   #=================================================
   #
+  if (method != 'legacy'):
+    checkMethod(method, ('legacy', 'fast'))
+    if (n * p / (1.0 - p) < PASCALTABLE):
+      table = PascalTable(n, p)
+      if (size is not None):
+        if (numpy is None):
+          return [bisect_right(table, random()) for i in range(0,size)]
+        return numpy.searchsorted(table, uniforms(size), 'right')
+      return (bisect_right(table, random()))
+    if (size is not None):
+      return scalars(PascalMixture, size, n, p)
+    return PascalMixture(n, p)
+
+  if (size is not None):
+    if (numpy is None):
+      return scalars(Pascal, size, n, p)
+
+    def total(u):
+      g = (numpy.log(1.0 - u) / log(p)).astype(numpy.int64)
+      return g.sum(axis=1)
+
+    return rows(total, size, n)
    
   x = 0
 
@@ -93,12 +344,65 @@ def Pascal(n,p):
     x += Geometric(p)
   return (x)
 
-def Poisson(m):
+@lru_cache(maxsize=32)
+def PascalTable(n,p):
+  #=================================================================
+  #The Pascal(n, p) cdf at 0, 1, 2, ... until it is 1 to double precision.
+  #The pdf is stepped in logs from x = 0 so that (1 - p)^n may underflow.
+  #=================================================================
+  table = []
+  mean = n * p / (1.0 - p)
+  logf = n * log(1.0 - p)
+  F = exp(logf)
+  x = 0
+  while (F < 1.0 - 1e-16) and ((x <= mean) or (logf > -745.0)):
+    table.append(F)
+    logf += log(p * (n + x) / (x + 1.0))
+    x += 1
+    F += exp(logf)
+  table.append(1.0)
+  if (numpy is not None):
+    table = numpy.array(table)
+  return table
+
+def PascalMixture(n,p):
+  #Pascal(n, p, method='fast') for a large mean: Poisson(Gamma(n) * p/(1-p))
+  m = StandardGamma(n) * p / (1.0 - p)
+  if (m < POISSONPTRS):
+    return PoissonInversion(m)
+  return PoissonPTRS(m)
+
+def Poisson(m, size=None, method='legacy'):
   #================================================== 
   #Returns a Poisson distributed non-negative integer. 
   #NOTE: use m > 0
+  #
+  #method='legacy' counts Exponential(1.0) draws until their sum passes
+  #m, about m logs and uniforms per variate.  method='fast' inverts a
+  #cached cdf table for m < POISSONPTRS and otherwise uses the PTRS
+  #transformed rejection method of Hormann, Insurance: Mathematics and
+  #Economics, 1993, vol 12, pp 39-45, which needs about 2.3 uniforms.
   #==================================================
   # 
+  if (method != 'legacy'):
+    checkMethod(method, ('legacy', 'fast'))
+    if (m < POISSONPTRS):
+      if (size is not None) and (numpy is not None):
+        return numpy.searchsorted(PoissonTable(m), uniforms(size), 'right')
+      table = PoissonTable(m)
+      if (size is not None):
+        return [bisect_right(table, random()) for i in range(0,size)]
+      return (bisect_right(table, random()))
+    if (size is not None):
+      if (numpy is None):
+        return scalars(PoissonPTRS, size, m)
+      return PoissonPTRSBlock(m, size)
+    return PoissonPTRS(m)
+  if (size is not None):
+    if (numpy is None):
+      return scalars(Poisson, size, m)
+    return PoissonBlock(m, size)
+
   t = 0.0
   x = 0
 
@@ -108,43 +412,285 @@ def Poisson(m):
   
   return (x - 1)
 
-def Uniform(a,b):
+def PoissonBlock(m, size):
+  #=====================================================================
+  #size=n for Poisson.  Each variate uses a random number of uniforms,
+  #so the exponentials are made a block at a time and summed in order;
+  #the uniforms that are left over are given back to the stream.
+  #=====================================================================
+  x = numpy.empty(size, dtype=numpy.int64)
+  chunk = min(int(size * (m + 1)) + 64, 262144)
+  e = []
+  j = 0
+  for i in range(0,size):
+    t = 0.0
+    k = 0
+    while (t < m):
+      if (j == len(e)):
+        e = (-numpy.log(1.0 - uniforms(chunk))).tolist()
+        j = 0
+      t += e[j]
+      j += 1
+      k += 1
+    x[i] = k - 1
+  skip(j - len(e))
+  return x
+
+@lru_cache(maxsize=32)
+def PoissonTable(m):
+  #=================================================================
+  #The Poisson(m) cdf at 0, 1, 2, ... until it is 1 to double precision;
+  #x = bisect_right(table, u) is then the idf of u, as in rvms.idfPoisson
+  #=================================================================
+  table = []
+  f = exp(-m)
+  F = f
+  k = 0
+  while (F < 1.0 - 1e-16) and ((k <= m) or (f > 0.0)):
+    table.append(F)
+    k += 1
+    f = f * m / k
+    F += f
+  table.append(1.0)
+  if (numpy is not None):
+    table = numpy.array(table)
+  return table
+
+def PoissonInversion(m):
+  #Poisson(m) by a sequential search of the cdf, for m < POISSONPTRS
+  x = 0
+  f = exp(-m)
+  F = f
+  u = random()
+  while (u > F):
+    x += 1
+    f *= m / x
+    F += f
+  return (x)
+
+def PoissonConstants(m):
+  #the constants of PTRS for Poisson(m), m >= 10
+  slam = sqrt(m)
+  b = 0.931 + 2.53 * slam
+  a = -0.059 + 0.02483 * b
+  return (a, b, 1.1239 + 1.1328 / (b - 3.4), 0.9277 - 3.6224 / (b - 2.0))
+
+def PoissonPTRS(m):
+  #==================================================================
+  #Poisson(m, method='fast') for m >= POISSONPTRS: a pair of uniforms per
+  #trial, most trials being accepted by the first, cheap test
+  #==================================================================
+  a, b, invalpha, vr = PoissonConstants(m)
+  logm = log(m)
+  while (True):
+    u = random() - 0.5
+    v = random()
+    us = 0.5 - abs(u)
+    k = floor((2.0 * a / us + b) * u + m + 0.43)
+    if (us >= 0.07) and (v <= vr):
+      return (k)
+    if (k < 0) or ((us < 0.013) and (v > us)):
+      continue
+    if (log(v) + log(invalpha) - log(a / (us * us) + b) <=
+        -m + k * logm - lgamma(k + 1)):
+      return (k)
+
+def PoissonPTRSBlock(m, size):
+  #size=n for PoissonPTRS, trial by trial as in the scalar loop
+  a, b, invalpha, vr = PoissonConstants(m)
+  logm = log(m)
+
+  def trial(uv):
+    u = uv[:, 0] - 0.5
+    v = uv[:, 1]
+    us = 0.5 - numpy.abs(u)
+    k = numpy.floor((2.0 * a / us + b) * u + m + 0.43)
+    accept = (us >= 0.07) & (v <= vr)
+    test = ~accept & (k >= 0) & ~((us < 0.013) & (v > us))
+    kt = k[test]
+    lg = numpy.array([lgamma(x + 1.0) for x in kt.tolist()])
+    accept[test] = (numpy.log(v[test]) + log(invalpha) -
+                    numpy.log(a / (us[test] * us[test]) + b) <=
+                    -m + kt * logm - lg)
+    return (k.astype(numpy.int64), accept)
+
+  return RejectionBlock(size, 2, 0.8, trial)
+
+def RejectionBlock(size, width, rate, trial):
+  #==================================================================
+  #size=n for a rejection method whose trials each take width uniforms
+  #and succeed with probability about rate.  trial maps a block of
+  #trials (one row of uniforms each) to their values and an accept
+  #mask.  The first n accepted values are returned and the uniforms of
+  #the trials after the last of them are given back to the stream, so
+  #the variates and the stream are those of n scalar calls.
+  #==================================================================
+  out = [numpy.empty(0, dtype=numpy.int64)]
+  n = 0
+  while (n < size):
+    trials = int((size - n) / rate) + 16
+    with numpy.errstate(divide='ignore', invalid='ignore', over='ignore'):
+      values, accept = trial(uniforms(trials, width))
+    index = numpy.flatnonzero(accept)[:size - n]
+    out.append(values[index])
+    n += len(index)
+    if (n == size):
+      skip(-width * (trials - 1 - int(index[-1])))
+  return numpy.concatenate(out)
+
+def Uniform(a,b,size=None):
   #=========================================================== 
   #Returns a uniformly distributed real number between a and b. 
   #NOTE: use a < b
   #===========================================================
   #
+  if (size is not None):
+    if (numpy is None):
+      return scalars(Uniform, size, a, b)
+    return a + (b - a) * uniforms(size)
   return (a + (b - a) * random())
 
-def Exponential(m):
+def Exponential(m, size=None):
   #=========================================================
   #Returns an exponentially distributed positive real number. 
   #NOTE: use m > 0.0
   #=========================================================
   #
+  if (size is not None):
+    if (numpy is None):
+      return scalars(Exponential, size, m)
+    return -m * numpy.log(1.0 - uniforms(size))
   return (-m * log(1.0 - random()))
 
-def Erlang(n,b):
+def Erlang(n,b,size=None,method='legacy'):
   #================================================== 
   #Returns an Erlang distributed positive real number.
   #NOTE: use n > 0 and b > 0.0
+  #
+  #method='legacy' adds n Exponential(b) variates, n logs.  method='fast'
+  #takes -b * log of the product of n uniforms, one log, for n < ERLANGGAMMA
+  #and otherwise b times a Gamma(n) variate of Marsaglia & Tsang.
   #==================================================
   #
+  if (method != 'legacy'):
+    checkMethod(method, ('legacy', 'fast'))
+    if (n >= ERLANGGAMMA):
+      x = StandardGamma(n, size)
+      if (size is not None) and (numpy is None):
+        return [b * t for t in x]
+      return b * x
+    if (size is not None):
+      if (numpy is None):
+        return scalars(Erlang, size, n, b, None, method)
+
+      def product(u):
+        u = 1.0 - u
+        x = u[:, 0].copy()
+        for i in range(1,n):             # multiply in the scalar order
+          x *= u[:, i]
+        return -b * numpy.log(x)
+
+      return rows(product, size, n)
+    x = 1.0 - random()
+    for i in range(1,n):
+      x *= 1.0 - random()
+    return (-b * log(x))
+
+  if (size is not None):
+    if (numpy is None):
+      return scalars(Erlang, size, n, b)
+
+    def total(u):
+      e = -b * numpy.log(1.0 - u)
+      x = numpy.zeros(len(u))
+      for i in range(0,n):               # add in the scalar order
+        x += e[:, i]
+      return x
+
+    return rows(total, size, n)
+
   x = 0.0
 
   for i in range(0,n): 
     x += Exponential(b)
   return (x)
 
-def Normal(m,s):
+def StandardGamma(a, size=None):
+  #========================================================================
+  #Returns a Gamma(a, 1) distributed positive real number, a > 0.
+  #
+  #Uses the method of Marsaglia & Tsang, ACM Transactions on Mathematical
+  #Software, 2000, vol 26, pp 363-372: a Normal and a uniform per trial and
+  #at least 95% of trials accepted.  For a < 1 a Gamma(a + 1) variate is
+  #multiplied by w^(1/a) for a third uniform w.  Every trial takes its two
+  #(or three) uniforms, so size=n can run the trials a block at a time.
+  #========================================================================
+  if (size is not None) and (numpy is None):
+    return scalars(StandardGamma, size, a)
+  boost = (a < 1.0)
+  if (boost):
+    e = 1.0 / a
+    a += 1.0
+  d = a - 1.0 / 3.0
+  c = 1.0 / sqrt(9.0 * d)
+
+  if (size is not None):
+    def trial(u):
+      x = OdehEvans(u[:, 0])
+      v = 1.0 + c * x
+      v = v * v * v
+      accept = (v > 0.0) & ((u[:, 1] < 1.0 - 0.0331 * x * x * x * x) |
+                            (numpy.log(u[:, 1]) < 0.5 * x * x +
+                             d * (1.0 - v + numpy.log(v))))
+      g = d * v
+      if (boost):
+        g = g * u[:, 2] ** e
+      return (g, accept)
+
+    return RejectionBlock(size, 3 if boost else 2, 0.9, trial)
+
+  while (True):
+    x = Normal(0.0, 1.0)
+    u = random()
+    if (boost):
+      w = random()
+    v = 1.0 + c * x
+    v = v * v * v
+    if (v > 0.0) and ((u < 1.0 - 0.0331 * x * x * x * x) or
+                      (log(u) < 0.5 * x * x + d * (1.0 - v + log(v)))):
+      if (boost):
+        return (d * v * w ** e)
+      return (d * v)
+
+def Normal(m,s,size=None,method='legacy'):
   #========================================================================
   #Returns a normal (Gaussian) distributed real number.
   #NOTE: use s > 0.0
   #
   #Uses a very accurate approximation of the normal idf due to Odeh & Evans, 
   #J. Applied Statistics, 1974, vol 23, pp 96-97.
+  #
+  #method='fast' uses the ziggurat method instead (see Ziggurat), which
+  #needs neither a log nor a sqrt for about 99% of the variates.
   #========================================================================
   #
+  if (method != 'legacy'):
+    checkMethod(method, ('legacy', 'fast'))
+    if (size is not None):
+      if (numpy is None):
+        return [m + s * Ziggurat() for i in range(0,size)]
+      return m + s * ZigguratBlock(size)
+    return (m + s * Ziggurat())
+
+  if (size is not None):
+    if (numpy is None):
+      return scalars(Normal, size, m, s)
+    return m + s * OdehEvans(uniforms(size))
+
+  return (m + s * OdehEvansValue(random()))
+
+def OdehEvansValue(u):
+  #the Odeh & Evans approximation of the Normal(0, 1) idf at u, for Normal
   p0 = 0.322232431088     
   q0 = 0.099348462606
   p1 = 1.0                
@@ -156,7 +702,6 @@ def Normal(m,s):
   p4 = 0.453642210148e-4  
   q4 = 0.385607006340e-2
 
-  u = random()
   if (u < 0.5):
     t = sqrt(-2.0 * log(u))
   else:
@@ -166,26 +711,180 @@ def Normal(m,s):
   q   = q0 + t * (q1 + t * (q2 + t * (q3 + t * q4)))
 
   if (u < 0.5):
-    z = (p / q) - t
+    return (p / q) - t
   else:
-    z = t - (p / q)
+    return t - (p / q)
+
+def OdehEvans(u):
+  #=================================================================
+  #The Odeh & Evans approximation of Normal for an ndarray u of uniforms
+  #=================================================================
+  p0 = 0.322232431088     
+  q0 = 0.099348462606
+  p1 = 1.0                
+  q1 = 0.588581570495
+  p2 = 0.342242088547     
+  q2 = 0.531103462366
+  p3 = 0.204231210245e-1  
+  q3 = 0.103537752850
+  p4 = 0.453642210148e-4  
+  q4 = 0.385607006340e-2
 
-  return (m + s * z)
+  low = (u < 0.5)
+  t = numpy.sqrt(-2.0 * numpy.log(numpy.where(low, u, 1.0 - u)))
+  p   = p0 + t * (p1 + t * (p2 + t * (p3 + t * p4)))
+  q   = q0 + t * (q1 + t * (q2 + t * (q3 + t * q4)))
+  return numpy.where(low, (p / q) - t, t - (p / q))
 
-def Lognormal(a,b):
+def Lognormal(a,b,size=None,method='legacy'):
   # ==================================================== 
   #Returns a lognormal distributed positive real number. 
   #NOTE: use b > 0.0
+  #
+  #method='fast' takes the Normal variate from the ziggurat.
   #====================================================
   #
+  if (method != 'legacy'):
+    checkMethod(method, ('legacy', 'fast'))
+    if (size is not None):
+      if (numpy is None):
+        return [exp(a + b * Ziggurat()) for i in range(0,size)]
+      return numpy.exp(a + b * ZigguratBlock(size))
+    return (exp(a + b * Ziggurat()))
+
+  if (size is not None):
+    if (numpy is None):
+      return scalars(Lognormal, size, a, b)
+    return numpy.exp(a + b * OdehEvans(uniforms(size)))
   return (exp(a + b * Normal(0.0, 1.0)))
 
-def Chisquare(n):
+def zigguratTables():
+  #===================================================================
+  #The ZIGLAYERS layers of the ziggurat of Marsaglia & Tsang, Journal of
+  #Statistical Software, 2000, vol 5, issue 8, for f(x) = exp(-x*x/2).
+  #Each layer has area ZIGAREA; layer i spans |x| < x[i] between the
+  #heights f[i] and f[i+1], and layer 0 is the base strip plus the tail
+  #beyond ZIGTAIL, so x[0] = ZIGAREA / f(ZIGTAIL) and x[ZIGLAYERS] = 0.
+  #===================================================================
+  x = [0.0] * (ZIGLAYERS + 1)
+  x[0] = ZIGAREA / exp(-0.5 * ZIGTAIL * ZIGTAIL)
+  x[1] = ZIGTAIL
+  for i in range(1,ZIGLAYERS - 1):
+    x[i + 1] = sqrt(-2.0 * log(ZIGAREA / x[i] + exp(-0.5 * x[i] * x[i])))
+  f = [exp(-0.5 * t * t) for t in x]
+  return (x, f)
+
+ZIGX, ZIGF = zigguratTables()
+
+def Ziggurat(draw=random):
+  #====================================================================
+  #Returns a Normal(0, 1) variate by the ziggurat method, taking its
+  #uniforms from draw.  The top seven bits of a uniform pick a layer and
+  #the rest a point x across it; x is returned at once if it lies inside
+  #the layer below, which it does about 99% of the time.  Otherwise one
+  #more uniform tests the wedge, or two more sample the tail, and a
+  #rejected point starts again.
+  #====================================================================
+  u = draw() * ZIGLAYERS
+  i = int(u)
+  x = (2.0 * (u - i) - 1.0) * ZIGX[i]
+  if (abs(x) < ZIGX[i + 1]):
+    return (x)
+  return ZigguratEdge(i, x, draw)
+
+def ZigguratEdge(i, x, draw=random):
+  #the wedge or tail of layer i at the point x, for Ziggurat, taking
+  #further uniforms from draw
+  while (True):
+    if (i == 0):
+      while (True):
+        t = -log(draw()) / ZIGTAIL
+        y = -log(draw())
+        if (y + y > t * t):
+          if (x > 0.0):
+            return (ZIGTAIL + t)
+          return (-ZIGTAIL - t)
+    if (ZIGF[i + 1] + draw() * (ZIGF[i] - ZIGF[i + 1]) < exp(-0.5 * x * x)):
+      return (x)
+    u = draw() * ZIGLAYERS
+    i = int(u)
+    x = (2.0 * (u - i) - 1.0) * ZIGX[i]
+    if (abs(x) < ZIGX[i + 1]):
+      return (x)
+
+def ZigguratBlock(size, stream=None):
+  #==================================================================
+  #size=n for Ziggurat, from a stream (the current stream by default).
+  #A block of uniforms is mapped to points at once; each point starts a
+  #variate and the runs of points inside their layers are copied out as
+  #they are.  At a point that is not, ZigguratEdge finishes the variate
+  #with the uniforms that follow it in the block (then from the stream),
+  #and the next variate starts after them.  Unused uniforms are given
+  #back to the stream, so the variates and the stream are those of n
+  #scalar calls.
+  #==================================================================
+  def draw():
+    return rngs.streams.get(stream).random()
+  if (numpy is None):
+    return [Ziggurat(draw) for i in range(0,size)]
+  x = numpy.array(ZIGX)
+  out = numpy.empty(size)
+  n = 0
+  while (n < size):
+    block = (size - n) + (size - n) // 32 + 16
+    u = uniforms(block, None, stream)
+    v = u * ZIGLAYERS
+    i = v.astype(numpy.int64)
+    z = (2.0 * (v - i) - 1.0) * x[i]
+    edges = numpy.flatnonzero(numpy.abs(z) >= x[i + 1]).tolist()
+    edges.append(block)
+    u = u.tolist()
+    p = 0
+    def blockDraw():
+      nonlocal p
+      p += 1
+      if (p <= block):
+        return u[p - 1]
+      return draw()
+    for e in edges:
+      if (e < p):
+        continue
+      k = min(e - p, size - n)
+      out[n:n + k] = z[p:p + k]
+      n += k
+      p += k
+      if (n == size) or (e == block):
+        break
+      p += 1
+      out[n] = ZigguratEdge(int(i[e]), float(z[e]), blockDraw)
+      n += 1
+      if (n == size) or (p >= block):
+        break
+    if (p < block):
+      skip(-(block - p), stream)
+  return out
+
+def Chisquare(n, size=None, method='legacy'):
   #=====================================================
   #Returns a chi-square distributed positive real number. 
   #NOTE: use n > 0
+  #
+  #method='legacy' adds the squares of n Normal variates.  method='fast'
+  #returns 2 * StandardGamma(n / 2), whose cost does not depend on n.
   #=====================================================
   #
+  if (method != 'legacy'):
+    checkMethod(method, ('legacy', 'fast'))
+    x = StandardGamma(n / 2.0, size)
+    if (size is not None) and (numpy is None):
+      return [2.0 * t for t in x]
+    return 2.0 * x
+
+  if (size is not None):
+    if (numpy is None):
+      return scalars(Chisquare, size, n)
+    return rows(SumOfSquares, size, n)
+
   x = 0.0
 
   for i in range(0,n):
@@ -195,14 +894,1010 @@ def Chisquare(n):
   return (x)
 
 
-def Student(n):
+def SumOfSquares(u):
+  #a Chisquare variate from each row of the n by k ndarray u of uniforms
+  z = OdehEvans(u)
+  x = numpy.zeros(len(u))
+  for i in range(0,u.shape[1]):          # add in the scalar order
+    x += z[:, i] * z[:, i]
+  return x
+
+def Student(n, size=None, method='legacy'):
   #=========================================== 
   #Returns a student-t distributed real number.
   #NOTE: use n > 0
+  #
+  #method='legacy' divides a Normal by the root of Chisquare(n) / n, i.e.
+  #n + 1 Normal variates.  method='fast' uses the polar method of Bailey,
+  #Mathematics of Computation, 1994, vol 62, pp 779-781: a point (u, v) is
+  #drawn uniformly in the unit disc (two uniforms per trial, pi / 4 of the
+  #trials accepted) and t = u * sqrt(n * (w^(-2/n) - 1) / w), w = u*u + v*v.
   #===========================================
   #
+  if (method != 'legacy'):
+    checkMethod(method, ('legacy', 'fast'))
+    if (size is not None):
+      if (numpy is None):
+        return scalars(StudentPolar, size, n)
+
+      def trial(uv):
+        u = 2.0 * uv[:, 0] - 1.0
+        v = 2.0 * uv[:, 1] - 1.0
+        w = u * u + v * v
+        t = u * numpy.sqrt(n * (w ** (-2.0 / n) - 1.0) / w)
+        return (t, w <= 1.0)
+
+      return RejectionBlock(size, 2, 0.75, trial)
+    return StudentPolar(n)
+
+  if (size is not None):
+    if (numpy is None):
+      return scalars(Student, size, n)
+
+    def ratio(u):                        # the Normal, then the Chisquare
+      return OdehEvans(u[:, 0]) / numpy.sqrt(SumOfSquares(u[:, 1:]) / n)
+
+    return rows(ratio, size, n + 1)
   return (Normal(0.0, 1.0) / sqrt(Chisquare(n) / n))
 
+def StudentPolar(n):
+  #Student(n, method='fast'), see above
+  while (True):
+    u = 2.0 * random() - 1.0
+    v = 2.0 * random() - 1.0
+    w = u * u + v * v
+    if (w <= 1.0):
+      return (u * sqrt(n * (w ** (-2.0 / n) - 1.0) / w))
+
+
+class Distribution:
+  #======================================================================
+  #The base of the frozen distributions in dist.  A frozen distribution
+  #holds its parameters, the constants it derives from them and the
+  #stream it draws from (an index into rngs.streams, or None for the
+  #current stream at each draw).  sample() returns one variate, sample(n)
+  #the n that n calls would return (as a size=n generator does) and
+  #iterating yields variates one after another, e.g.
+  #
+  #     demand = dist.Equilikely(10, 50, stream=1)
+  #     for d in demand: ...
+  #
+  #The bound random of the stream is kept in random and taken again when
+  #rngs.generation shows that the stream objects have been replaced (by
+  #useBackend, countDraws, prefetch, ...), so the object keeps drawing
+  #the right values without looking the stream up at every draw.  An
+  #iterator binds once, when it starts.
+  #======================================================================
+  __slots__ = ('stream', 'random', 'generation')
+
+  def __init__(self, stream=None):
+    self.bind(stream)
+
+  def bind(self, stream=None):
+    self.stream = stream
+    self.rebind()
+    return self
+
+  def rebind(self):
+    self.generation = rngs.generation
+    if (self.stream is None):
+      self.random = rngs.random          # the current stream at each draw
+    else:
+      self.random = rngs.streams.get(self.stream).random
+
+  def sample(self, n=None):
+    if (self.generation != rngs.generation):
+      self.rebind()
+    if (n is None):
+      return self.value(self.random())
+    if (numpy is None):
+      return [self.value(self.random()) for i in range(0,n)]
+    return self.values(uniforms(n, None, self.stream))
+
+  def __iter__(self):
+    if (self.generation != rngs.generation):
+      self.rebind()
+    value = self.value
+    draw = self.random
+    while (True):
+      yield value(draw())
+
+  def __getstate__(self):
+    #the slots but the bound random, which is taken again on loading
+    names = [a for c in type(self).__mro__ for a in getattr(c, '__slots__', ())]
+    return dict((a, getattr(self, a)) for a in names
+                if (a not in ('random', 'generation')) and hasattr(self, a))
+
+  def __setstate__(self, state):
+    for a, v in state.items():
+      setattr(self, a, v)
+    self.rebind()
+
+  def __repr__(self):
+    args = ', '.join(repr(getattr(self, a)) for a in self.parameters)
+    return "dist.{0}({1})".format(type(self).__name__, args)
+
+
+class dist:
+  #======================================================================
+  #Frozen versions of the generators whose variates are a function of one
+  #uniform, plus Normal and Lognormal with either method.  Each gives the
+  #same variates as the generator of the same name from the same stream.
+  #======================================================================
+
+  class Bernoulli(Distribution):
+    parameters = ('p',)
+    __slots__ = parameters + ('q',)
+
+    def __init__(self, p, stream=None):
+      self.p = p
+      self.q = 1 - p
+      self.bind(stream)
+
+    def value(self, u):
+      if (u < self.q):
+        return(0)
+      else:
+        return(1)
+
+    def values(self, u):
+      return (u >= self.q).astype(numpy.int64)
+
+  class Equilikely(Distribution):
+    parameters = ('a', 'b')
+    __slots__ = parameters + ('width',)
+
+    def __init__(self, a, b, stream=None):
+      self.a = a
+      self.b = b
+      self.width = b - a + 1
+      self.bind(stream)
+
+    def value(self, u):
+      return (self.a + int(self.width * u))
+
+    def values(self, u):
+      return self.a + (self.width * u).astype(numpy.int64)
+
+  class Geometric(Distribution):
+    parameters = ('p',)
+    __slots__ = parameters + ('logp',)
+
+    def __init__(self, p, stream=None):
+      self.p = p
+      self.logp = log(p)
+      self.bind(stream)
+
+    def value(self, u):
+      return (int(log(1.0 - u) / self.logp))
+
+    def values(self, u):
+      return (numpy.log(1.0 - u) / self.logp).astype(numpy.int64)
+
+  class Uniform(Distribution):
+    parameters = ('a', 'b')
+    __slots__ = parameters + ('width',)
+
+    def __init__(self, a, b, stream=None):
+      self.a = a
+      self.b = b
+      self.width = b - a
+      self.bind(stream)
+
+    def value(self, u):
+      return (self.a + self.width * u)
+
+    def values(self, u):
+      return self.a + self.width * u
+
+  class Exponential(Distribution):
+    parameters = ('m',)
+    __slots__ = parameters + ('negm',)
+
+    def __init__(self, m, stream=None):
+      self.m = m
+      self.negm = -m
+      self.bind(stream)
+
+    def value(self, u):
+      return (self.negm * log(1.0 - u))
+
+    def values(self, u):
+      return self.negm * numpy.log(1.0 - u)
+
+  class Normal(Distribution):
+    #method='fast' takes more than one uniform for about 1% of the variates
+    parameters = ('m', 's', 'method')
+    __slots__ = parameters
+
+    def __init__(self, m, s, stream=None, method='legacy'):
+      checkMethod(method, ('legacy', 'fast'))
+      self.m = m
+      self.s = s
+      self.method = method
+      self.bind(stream)
+
+    def value(self, u):
+      return (self.m + self.s * OdehEvansValue(u))
+
+    def values(self, u):
+      return self.m + self.s * OdehEvans(u)
+
+    def sample(self, n=None):
+      if (self.method == 'legacy'):
+        return Distribution.sample(self, n)
+      if (self.generation != rngs.generation):
+        self.rebind()
+      if (n is None):
+        return (self.m + self.s * Ziggurat(self.random))
+      z = ZigguratBlock(n, self.stream)
+      if (numpy is None):
+        return [self.m + self.s * t for t in z]
+      return self.m + self.s * z
+
+    def __iter__(self):
+      if (self.method == 'legacy'):
+        return Distribution.__iter__(self)
+      return iter(self.sample, None)
+
+  class Lognormal(Normal):
+    #a Normal(a, b) variate z is returned as exp(z)
+    parameters = ('a', 'b', 'method')
+    __slots__ = ()
+
+    def __init__(self, a, b, stream=None, method='legacy'):
+      dist.Normal.__init__(self, a, b, stream, method)
+
+    a = property(lambda self: self.m)
+    b = property(lambda self: self.s)
+
+    def value(self, u):
+      return (exp(dist.Normal.value(self, u)))
+
+    def values(self, u):
+      return numpy.exp(dist.Normal.values(self, u))
+
+    def sample(self, n=None):
+      if (self.method == 'legacy'):
+        return Distribution.sample(self, n)
+      z = dist.Normal.sample(self, n)
+      if (n is None):
+        return (exp(z))
+      if (numpy is None):
+        return [exp(t) for t in z]
+      return numpy.exp(z)
+
+  class Alias(Distribution):
+    #====================================================================
+    #An arbitrary discrete distribution by the alias method of Walker, as
+    #set up by Vose, IEEE Transactions on Software Engineering, 1991, vol
+    #17, pp 972-975.  values[i] (kept as points[i]) has probability
+    #weights[i] / sum(weights); values defaults to 0, 1, ...  Each variate
+    #takes one uniform u: column i = int(n * u) is chosen and the fraction
+    #n * u - i picks points[i] or its alias, so a draw costs O(1) however
+    #many values there are.  About 31 - log2(n) bits of u are left for
+    #the fraction, so the probabilities are exact to about n / 2^31.
+    #
+    #fromCounts builds one from tallied data such as ddh prints.  The
+    #tables pickle with the stream index, and are bound again on loading.
+    #====================================================================
+    parameters = ('weights', 'points')
+    __slots__ = parameters + ('n', 'cut', 'alias', 'arrays')
+
+    def __init__(self, weights, values=None, stream=None):
+      weights = [float(w) for w in weights]
+      n = len(weights)
+      total = sum(weights)
+      if (n == 0) or (min(weights) < 0.0) or (not total > 0.0):
+        raise ValueError("weights must be non-negative with a positive sum")
+      if (values is None):
+        values = list(range(0,n))
+      elif (len(values) != n):
+        raise ValueError("values and weights differ in length")
+      self.points = list(values)
+      self.weights = weights
+      self.n = n
+      cut = [w * n / total for w in weights]
+      alias = list(range(0,n))
+      small = [i for i in range(0,n) if cut[i] < 1.0]
+      large = [i for i in range(0,n) if cut[i] >= 1.0]
+      while (small) and (large):
+        i = small.pop()
+        j = large.pop()
+        alias[i] = j                   # column i is i below cut[i], else j
+        cut[j] -= 1.0 - cut[i]
+        if (cut[j] < 1.0):
+          small.append(j)
+        else:
+          large.append(j)
+      for i in small + large:          # left over only through rounding
+        cut[i] = 1.0
+      self.cut = cut
+      self.alias = alias
+      self.arrays = None
+      self.bind(stream)
+
+    @classmethod
+    def fromCounts(cls, counts, stream=None):
+      #counts is a dict {value: count} or a sequence of (value, count) pairs
+      if (isinstance(counts, dict)):
+        counts = counts.items()
+      counts = list(counts)
+      return cls([c for v, c in counts], [v for v, c in counts], stream)
+
+    def value(self, u):
+      u *= self.n
+      i = int(u)
+      if (u - i < self.cut[i]):
+        return self.points[i]
+      return self.points[self.alias[i]]
+
+    def values(self, u):
+      if (self.arrays is None):
+        self.arrays = (numpy.array(self.cut), numpy.array(self.alias),
+                       numpy.array(self.points))
+      cut, alias, values = self.arrays
+      u = u * self.n
+      i = u.astype(numpy.int64)
+      return values[numpy.where(u - i < cut[i], i, alias[i])]
+
+    def __getstate__(self):
+      return (self.points, self.weights, self.n, self.cut, self.alias,
+              self.stream)
+
+    def __setstate__(self, state):
+      self.points, self.weights, self.n, self.cut, self.alias, stream = state
+      self.arrays = None
+      self.bind(stream)
+
+  class Inversion(Distribution):
+    #====================================================================
+    #Inversion by rvms.idf<name> (e.g. Inversion('Poisson', 4.5)) without
+    #its search or Newton iteration per variate.  The variates are a
+    #non-decreasing function of one uniform each, so the streams of two
+    #runs stay synchronized, as common random numbers need.
+    #
+    #For the discrete distributions the rvms cdf is tabled once and a
+    #guide table (Chen & Asau) starts the search at most a step or two
+    #below the answer, so the variates are exactly those of the idf.  For
+    #the continuous ones the idf is interpolated by cubics (see
+    #continuousTable), found through a guide table in the same way, and
+    #the exact idf is used for u within INVERSIONTAIL of 0 or 1.  error
+    #holds the largest difference found from the exact idf, relative to
+    #1 + |x|; it is at most tolerance unless INVERSIONLIMIT intervals
+    #were not enough.  Both the table and the tails use idfBracketed in
+    #place of the Newton iteration of the rvms idf, which need not
+    #converge far into the tails, so every u in (0, 1) is inverted to
+    #within about 1e-15 * (1 + |x|) of the rvms cdf; the rvms cdf itself
+    #is accurate to about rvms.TINY, which bounds the error in the tails.
+    #Tables are cached per parameter set.
+    #====================================================================
+    parameters = ('name', 'arguments')
+    __slots__ = parameters + ('table', 'error', 'arrays')
+
+    def __init__(self, name, *arguments, stream=None, tolerance=1e-9):
+      if (not hasattr(rvms, 'idf' + name)):
+        raise ValueError("rvms has no idf{0}".format(name))
+      self.name = name
+      self.arguments = arguments
+      if (name in DISCRETE):
+        self.table = discreteTable(name, arguments)
+        self.error = 0.0
+      else:
+        self.table = continuousTable(name, arguments, tolerance)
+        self.error = self.table[4]
+      self.arrays = None
+      self.bind(stream)
+
+    def exact(self, u):
+      if (self.name in DISCRETE):
+        return getattr(rvms, 'idf' + self.name)(*(self.arguments + (u,)))
+      return idfBracketed(self.name, self.arguments, u)
+
+    def value(self, u):
+      if (self.name in DISCRETE):
+        x0, F, guide = self.table
+        k = guide[int(u * len(guide))]
+        while (F[k] <= u):
+          k += 1
+          if (k == len(F)):
+            return self.exact(u)
+        return (x0 + k)
+      left, width, c, guide, error = self.table
+      if (u < left[0]) or (u >= left[-1]):
+        return self.exact(u)
+      k = guide[int((u - left[0]) / (left[-1] - left[0]) * len(guide))]
+      while (left[k + 1] <= u):
+        k += 1
+      s = (u - left[k]) / width[k]
+      return (c[0][k] + s * (c[1][k] + s * (c[2][k] + s * c[3][k])))
+
+    def values(self, u):
+      if (self.name in DISCRETE):
+        if (self.arrays is None):
+          self.arrays = numpy.array(self.table[1])
+        k = numpy.searchsorted(self.arrays, u, 'right')
+        x = self.table[0] + k
+        for i in numpy.flatnonzero(k == len(self.arrays)):
+          x[i] = self.exact(float(u[i]))
+        return x
+      if (self.arrays is None):
+        self.arrays = (numpy.array(self.table[0]), numpy.array(self.table[1]),
+                       numpy.array(self.table[2]))
+      left, width, c = self.arrays
+      k = numpy.clip(numpy.searchsorted(left, u, 'right') - 1, 0, len(width) - 1)
+      s = (u - left[k]) / width[k]
+      x = c[0][k] + s * (c[1][k] + s * (c[2][k] + s * c[3][k]))
+      for i in numpy.flatnonzero((u < left[0]) | (u >= left[-1])):
+        x[i] = self.exact(float(u[i]))
+      return x
+
+    def __repr__(self):
+      args = ', '.join(repr(a) for a in (self.name,) + self.arguments)
+      return "dist.Inversion({0})".format(args)
+
+  class Truncated(Inversion):
+    #====================================================================
+    #rvms.idf<name> truncated to a <= x <= b (either may be None), e.g.
+    #Truncated('Normal', 2.0, 0.5, a=1.0, b=3.0) for bounded service
+    #times, by inversion: a uniform u is mapped to
+    #
+    #     x = idf(F(a) + u * (F(b) - F(a)))
+    #
+    #with F the rvms cdf (F(a - 1) in place of F(a) for the discrete
+    #distributions), so each variate takes one uniform however narrow
+    #the window, where rejection would take 1 / (F(b) - F(a)) of them.
+    #method='legacy' calls the idf for every variate; method='fast'
+    #tables it once per parameter set, as Inversion does, over just
+    #(F(a), F(b)) for the continuous distributions, less the tails that
+    #Inversion leaves to the exact idf.  A window that lies wholly in one
+    #of those tails, e.g. Truncated('Normal', 0.0, 1.0, a=5.0, b=6.0),
+    #is not tabled, and 'fast' calls the idf (see idfBracketed) for every
+    #variate there too.
+    #====================================================================
+    parameters = ('name', 'arguments', 'a', 'b', 'method')
+    __slots__ = ('a', 'b', 'method', 'low', 'width')
+
+    def __init__(self, name, *arguments, a=None, b=None, stream=None,
+                 method='legacy', tolerance=1e-9):
+      checkMethod(method, ('legacy', 'fast'))
+      if (not hasattr(rvms, 'cdf' + name)):
+        raise ValueError("rvms has no cdf{0}".format(name))
+      self.name = name
+      self.arguments = arguments
+      self.a = a
+      self.b = b
+      self.method = method
+      cdf = getattr(rvms, 'cdf' + name)
+      low = 0.0
+      high = 1.0
+      if (a is not None):
+        if (name in DISCRETE):
+          if (a - 1 >= self.exact(0.5 / rngs.MODULUS)):
+            low = cdf(*(arguments + (a - 1,)))
+        else:
+          low = cdf(*(arguments + (a,)))
+      if (b is not None):
+        high = cdf(*(arguments + (b,)))
+      if (not high > low):
+        raise ValueError("the window [a, b] has no probability")
+      self.low = low
+      self.width = high - low
+      self.table = None
+      self.error = 0.0
+      if (method == 'fast'):
+        if (name in DISCRETE):
+          self.table = discreteTable(name, arguments)
+        else:
+          lo = max(low, INVERSIONTAIL)
+          hi = min(high, 1.0 - INVERSIONTAIL)
+          if (lo < hi):                # else the window lies in a tail
+            self.table = continuousTable(name, arguments, tolerance, lo, hi)
+            self.error = self.table[4]
+      self.arrays = None
+      self.bind(stream)
+
+    def value(self, u):
+      v = self.low + u * self.width
+      if (self.table is None):
+        return self.exact(v)
+      return dist.Inversion.value(self, v)
+
+    def values(self, u):
+      v = self.low + u * self.width
+      if (self.table is None):
+        return numpy.array([self.exact(t) for t in v.tolist()])
+      return dist.Inversion.values(self, v)
+
+    def __repr__(self):
+      args = ', '.join(repr(t) for t in (self.name,) + self.arguments)
+      return "dist.Truncated({0}, a={1!r}, b={2!r})".format(args, self.a, self.b)
+
+
+class TapeCache:
+  #======================================================================
+  #A directory of recorded variates ("tapes"), so that scenario runs that
+  #all use the same arrivals or demands read them back instead of
+  #generating them again, e.g. in place of GetArrival's Exponential(2.0):
+  #
+  #     gaps = TapeCache().tape(Exponential, (2.0,), 20000, 123456789, 0)
+  #     arrivalTemp += gaps()
+  #
+  #A tape is keyed by the generator, the number of streams, whether they
+  #are antithetic, the seed planted, the replication and its length, the
+  #stream, the function (by module and qualified name) and its
+  #parameters; it holds the first n variates the function returns from
+  #that stream after plantSeeds(seed) and selectReplication, as native
+  #float64 values (those of size=n, see the note at the top).  The least
+  #recently used tapes are deleted once the files come to more than
+  #budget bytes.  Tapes are trusted as found, so the directory (TAPEDIR,
+  #one per user, by default) must be private: it is created with mode
+  #0700, and a TAPEDIR that others own or can write to is refused.
+  #======================================================================
+  __slots__ = ('directory', 'budget')
+
+  def __init__(self, directory=TAPEDIR, budget=TAPEBUDGET):
+    self.directory = directory
+    self.budget = budget
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if (directory == TAPEDIR) and (hasattr(os, 'getuid')):
+      s = os.stat(directory)
+      if (s.st_uid != os.getuid()) or (s.st_mode & 0o022):
+        raise PermissionError("{0} is not a private directory".format(
+                              directory))
+
+  def tape(self, f, parameters=(), n=BLOCKTAPE, seed=rngs.DEFAULT, stream=0,
+           **options):
+    #returns a Tape of f(*parameters, **options), recorded if need be
+    return Tape(self, f, tuple(parameters), n, seed, stream, options)
+
+  def path(self, key):
+    name = sha1(repr(key).encode()).hexdigest()
+    return os.path.join(self.directory, name + '.f8')
+
+  def record(self, key, f, parameters, n, options):
+    #==================================================================
+    #Writes the tape of key with n variates, unless it already has that
+    #many, and returns its path.  The recording draws from a new set of
+    #streams of the key's generator, planted with its seed and set to
+    #its number of streams, antithetic mode and replication, which is
+    #the default set only while f runs: the caller's set, its streams
+    #and their draw counts are left as they were.
+    #==================================================================
+    path = self.path(key)
+    if (os.path.exists(path)) and (os.path.getsize(path) >= 8 * n):
+      os.utime(path)                   # most recently used
+      return path
+    name, count, flipped, seed, replication, length, stream = key[0:7]
+    saved = rngs.streams
+    rngs.streams = rngs.BACKENDS[name](count)
+    try:
+      rngs.plantSeeds(seed)
+      if (flipped):
+        rngs.antithetic(True)
+      rngs.selectReplication(replication, length)
+      rngs.selectStream(stream)
+      x = f(*parameters, size=n, **options)
+    finally:
+      rngs.streams = saved
+      rngs.newGeneration()             # distributions bound meanwhile
+    temp = "{0}.tmp".format(path)
+    with open(temp, 'wb') as out:
+      if (numpy is not None):
+        out.write(numpy.asarray(x, dtype=numpy.float64).tobytes())
+      else:
+        out.write(array('d', x).tobytes())
+    os.replace(temp, path)
+    self.evict(path)
+    return path
+
+  def evict(self, keep=None):
+    #deletes the least recently used tapes until they fit in the budget
+    tapes = []
+    for name in os.listdir(self.directory):
+      if (name.endswith('.f8')):
+        p = os.path.join(self.directory, name)
+        s = os.stat(p)
+        tapes.append((s.st_mtime, s.st_size, p))
+    tapes.sort()
+    total = sum(t[1] for t in tapes)
+    for mtime, size, p in tapes:
+      if (total <= self.budget):
+        break
+      if (p != keep):
+        os.remove(p)
+        total -= size
+
+  def clear(self):
+    for name in os.listdir(self.directory):
+      if (name.endswith('.f8')):
+        os.remove(os.path.join(self.directory, name))
+
+
+class Tape:
+  #======================================================================
+  #The variates of a tape, memory-mapped and read back one per call (or
+  #n at a time by block(n)).  rewind() starts the tape again for the next
+  #scenario.  When a run needs more variates than were recorded the tape
+  #is recorded again twice as long (BLOCKTAPE if it was empty); the
+  #values already read are the same.
+  #======================================================================
+  __slots__ = ('cache', 'key', 'source', 'count', 'map', 'values',
+               'position')
+
+  def __init__(self, cache, f, parameters, n, seed, stream, options):
+    self.cache = cache
+    streams = rngs.streams
+    name = "{0}.{1}".format(f.__module__, f.__qualname__)
+    self.key = (streams.name, streams.count, streams.flipped, seed,
+                streams.replication, streams.length, stream, name,
+                parameters, tuple(sorted(options.items())))
+    self.source = (f, parameters, options)
+    self.map = None
+    self.values = memoryview(b'').cast('d')
+    self.position = 0
+    self.load(n)
+
+  def load(self, n):
+    f, parameters, options = self.source
+    path = self.cache.record(self.key, f, parameters, n, options)
+    self.close()
+    if (os.path.getsize(path) > 0):    # mmap cannot map an empty file
+      with open(path, 'rb') as file:
+        self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+      self.values = memoryview(self.map).cast('d')
+    self.count = len(self.values)
+
+  def close(self):
+    if (self.map is not None):
+      self.values.release()
+      self.values = memoryview(b'').cast('d')
+      self.map.close()
+      self.map = None
+
+  def __call__(self):
+    if (self.position == self.count):
+      self.load(2 * self.count or BLOCKTAPE)
+    x = self.values[self.position]
+    self.position += 1
+    return x
+
+  def block(self, n):
+    while (self.position + n > self.count):
+      self.load(2 * self.count or BLOCKTAPE)
+    x = self.values[self.position:self.position + n]
+    self.position += n
+    if (numpy is not None):
+      return numpy.array(x)
+    return x.tolist()
+
+  def __iter__(self):
+    while (True):
+      yield self()
+
+  def __len__(self):
+    return self.count
+
+  def rewind(self):
+    self.position = 0
+
+
+class ArrivalProcess:
+  #======================================================================
+  #The arrival times of a renewal process, start + x1, start + x1 + x2,
+  #..., where the gaps x1, x2, ... come from an rvgs generator f called
+  #as f(*parameters, size=n, **options) on the given stream (by default
+  #the one current when the process is made, whichever is current
+  #later), from a dist object (by sample(n)) or from a Tape (by
+  #block(n)).  The gaps are drawn size at a time and summed in order, so
+  #the times are those of
+  #
+  #     arrivalTemp += Exponential(2.0)
+  #
+  #repeated, without selecting the stream for every arrival.  Iterating
+  #yields the times lazily and at C speed, e.g. in ssq3
+  #
+  #     arrivals = iter(ArrivalProcess(Exponential, (2.0,), stream=0))
+  #     t.arrival = next(arrivals)
+  #
+  #The stream is drawn up to size gaps ahead, so it should be used for
+  #the arrivals only, as the programs do.
+  #======================================================================
+  __slots__ = ('f', 'parameters', 'options', 'stream', 'size', 'last',
+               'times')
+
+  def __init__(self, f, parameters=(), start=0.0, stream=None,
+               size=ARRIVALBLOCK, **options):
+    self.f = f
+    self.parameters = tuple(parameters)
+    self.options = options
+    if (stream is None):
+      stream = rngs.streams.stream
+    self.stream = stream
+    self.size = size
+    self.last = start                  # the last time generated
+    self.times = chain.from_iterable(self.blocks())
+
+  def gaps(self, n):
+    if (hasattr(self.f, 'sample')):
+      return self.f.sample(n)
+    if (hasattr(self.f, 'block')):
+      return self.f.block(n)
+    current = rngs.streams.stream
+    rngs.selectStream(self.stream)
+    try:
+      return self.f(*self.parameters, size=n, **self.options)
+    finally:
+      rngs.selectStream(current)
+
+  def blocks(self):
+    while (True):
+      x = self.gaps(self.size)
+      if (numpy is not None):
+        x = numpy.asarray(x, dtype=numpy.float64).tolist()
+      times = list(accumulate(x, initial=self.last))[1:]
+      self.last = times[-1]
+      yield times
+
+  def __iter__(self):
+    return self.times
+
+  def __next__(self):
+    return next(self.times)
+
+
+class NonstationaryArrivals(ArrivalProcess):
+  #======================================================================
+  #The arrival times of a nonhomogeneous Poisson process with the rate
+  #given by a table: rates[i] on [knots[i], knots[i + 1]) if linear is
+  #False, or the rate interpolated linearly between rates[i] at knots[i]
+  #and rates[i + 1] at knots[i + 1] if it is True.  With cycle=True the
+  #table repeats every knots[-1] - knots[0] (e.g. a daily profile),
+  #otherwise the last rate holds after knots[-1].
+  #
+  #The times are those of a unit-rate process (Exponential(1.0) gaps,
+  #drawn as by ArrivalProcess) mapped through the inverse of the
+  #cumulative rate L(t), the integral of the rate from knots[0] to t.
+  #Each arrival takes one uniform, however peaked the rate, where
+  #thinning would reject a fraction 1 - mean / peak of its candidates.
+  #======================================================================
+  __slots__ = ('knots', 'rates', 'linear', 'cycle', 'cumulative', 'period')
+
+  def __init__(self, knots, rates, linear=False, cycle=False, stream=None,
+               size=ARRIVALBLOCK):
+    knots = [float(t) for t in knots]
+    rates = [float(r) for r in rates]
+    if (len(rates) != len(knots) - (0 if linear else 1)) or (len(knots) < 2):
+      raise ValueError("{0} knots need {1} rates".format(len(knots),
+                       len(knots) - (0 if linear else 1)))
+    if (min(rates) < 0.0) or (any(a >= b for a, b in zip(knots, knots[1:]))):
+      raise ValueError("the knots must increase and the rates be non-negative")
+    if (not cycle) and (rates[-1] <= 0.0):
+      raise ValueError("the last rate must be positive unless cycle=True")
+    self.knots = knots
+    self.rates = rates
+    self.linear = linear
+    self.cycle = cycle
+    self.period = knots[-1] - knots[0]
+    L = [0.0]
+    for i in range(0,len(knots) - 1):
+      h = knots[i + 1] - knots[i]
+      if (linear):
+        L.append(L[-1] + 0.5 * h * (rates[i] + rates[i + 1]))
+      else:
+        L.append(L[-1] + h * rates[i])
+    if (not L[-1] > 0.0):
+      raise ValueError("the rate must not be zero everywhere")
+    self.cumulative = L
+    ArrivalProcess.__init__(self, Exponential, (1.0,), 0.0, stream, size)
+
+  def timeAt(self, s):
+    #=================================================================
+    #Returns the time t at which the cumulative rate L(t) reaches s.
+    #On a linear piece the rate is a + b * x at x past its knot, so x
+    #solves a * x + b * x * x / 2 = d, i.e. x = 2d / (a + sqrt(a*a + 2bd)).
+    #=================================================================
+    L = self.cumulative
+    offset = 0.0
+    if (self.cycle):
+      k = floor(s / L[-1])
+      s -= k * L[-1]
+      offset = k * self.period
+    elif (s >= L[-1]):
+      return (self.knots[-1] + (s - L[-1]) / self.rates[-1])
+    i = min(bisect_right(L, s) - 1, len(L) - 2)
+    d = s - L[i]
+    a = self.rates[i]
+    if (self.linear):
+      b = (self.rates[i + 1] - a) / (self.knots[i + 1] - self.knots[i])
+      q = a + sqrt(max(a * a + 2.0 * b * d, 0.0))
+      x = 2.0 * d / q if (q > 0.0) else 0.0
+    else:
+      x = d / a
+    return (offset + self.knots[i] + x)
+
+  def timesAt(self, s):
+    #timeAt for an ndarray s of cumulative rates
+    L = numpy.array(self.cumulative)
+    knots = numpy.array(self.knots)
+    rates = numpy.array(self.rates)
+    offset = 0.0
+    if (self.cycle):
+      k = numpy.floor(s / L[-1])
+      s = s - k * L[-1]
+      offset = k * self.period
+    i = numpy.minimum(numpy.searchsorted(L, s, 'right') - 1, len(L) - 2)
+    d = s - L[i]
+    a = rates[i]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+      if (self.linear):
+        b = (rates[i + 1] - a) / (knots[i + 1] - knots[i])
+        q = a + numpy.sqrt(numpy.maximum(a * a + 2.0 * b * d, 0.0))
+        x = numpy.where(q > 0.0, 2.0 * d / q, 0.0)
+      else:
+        x = d / a
+    t = offset + knots[i] + x
+    if (not self.cycle):
+      t = numpy.where(s >= L[-1], knots[-1] + (s - L[-1]) / rates[-1], t)
+    return t
+
+  def cumulativeAt(self, t):
+    #L(t), the expected number of arrivals in (knots[0], t]
+    L = self.cumulative
+    t -= self.knots[0]
+    base = 0.0
+    if (self.cycle):
+      k = floor(t / self.period)
+      t -= k * self.period
+      base = k * L[-1]
+    elif (t >= self.period):
+      return (L[-1] + (t - self.period) * self.rates[-1])
+    t += self.knots[0]
+    i = min(bisect_right(self.knots, t) - 1, len(self.knots) - 2)
+    x = t - self.knots[i]
+    a = self.rates[i]
+    if (self.linear):
+      b = (self.rates[i + 1] - a) / (self.knots[i + 1] - self.knots[i])
+      return (base + L[i] + x * (a + 0.5 * b * x))
+    return (base + L[i] + x * a)
+
+  def blocks(self):
+    for s in ArrivalProcess.blocks(self):
+      if (numpy is not None):
+        yield self.timesAt(numpy.array(s)).tolist()
+      else:
+        yield [self.timeAt(x) for x in s]
+
+
+DISCRETE = ('Bernoulli', 'Binomial', 'Equilikely', 'Geometric', 'Pascal',
+            'Poisson')
+POSITIVE = ('Chisquare', 'Erlang', 'Exponential', 'Lognormal')
+
+def idfBracketed(name, parameters, u):
+  #==================================================================
+  #The idf of a continuous rvms distribution at 0 < u < 1 by Newton's
+  #method on its cdf, kept inside an interval [lo, hi] around the
+  #answer that is first widened by doubling and then halved whenever a
+  #step would leave it, so unlike the rvms idf it converges for every
+  #u, however far into a tail.  Returns x to about 1e-15 * (1 + |x|).
+  #==================================================================
+  if (name in ('Uniform', 'Exponential')):
+    return getattr(rvms, 'idf' + name)(*(parameters + (u,)))
+  cdf = getattr(rvms, 'cdf' + name)
+  pdf = getattr(rvms, 'pdf' + name)
+  hi = 1.0
+  if (name in POSITIVE):
+    lo = 0.0
+  else:
+    lo = -1.0
+    while (cdf(*(parameters + (lo,))) > u) and (lo > -1e300):
+      hi = lo
+      lo *= 2.0
+  while (cdf(*(parameters + (hi,))) < u) and (hi < 1e300):
+    lo = hi
+    hi *= 2.0
+  x = 0.5 * (lo + hi)
+  for i in range(0,2200):              # enough to halve 2^1000 to 2^-1000
+    f = cdf(*(parameters + (x,))) - u
+    if (f == 0.0):
+      return x
+    if (f < 0.0):
+      lo = x
+    else:
+      hi = x
+    d = pdf(*(parameters + (x,)))
+    t = lo
+    if (d > 0.0) and (d < float('inf')):
+      t = x - f / d
+    if (not lo < t < hi):
+      t = 0.5 * (lo + hi)
+    if (abs(t - x) <= 1e-15 * (1.0 + abs(t))):
+      return t
+    x = t
+  return x
+
+@lru_cache(maxsize=32)
+def discreteTable(name, parameters):
+  #==================================================================
+  #For dist.Inversion: the rvms cdf of a discrete distribution at x0,
+  #x0 + 1, ... until it exceeds every uniform rngs can return, and a
+  #guide table whose j-th entry is the first index with cdf > j / g.
+  #==================================================================
+  cdf = getattr(rvms, 'cdf' + name)
+  idf = getattr(rvms, 'idf' + name)
+  x0 = idf(*(parameters + (0.5 / rngs.MODULUS,)))
+  F = []
+  while (len(F) < INVERSIONLIMIT):
+    F.append(cdf(*(parameters + (x0 + len(F),))))
+    if (F[-1] >= 1.0 - 0.5 / rngs.MODULUS):
+      break
+  g = len(F)
+  guide = []
+  k = 0
+  for j in range(0,g):
+    while (k < g - 1) and (F[k] <= j / g):
+      k += 1
+    guide.append(k)
+  return (x0, F, guide)
+
+@lru_cache(maxsize=32)
+def continuousTable(name, parameters, tolerance, lo=INVERSIONTAIL,
+                    hi=1.0 - INVERSIONTAIL):
+  #==================================================================
+  #For dist.Inversion: cubics that interpolate the rvms idf of a
+  #continuous distribution and its derivative 1 / pdf at both ends of
+  #each interval of u in (lo, hi), by default all but INVERSIONTAIL at
+  #either end, limited as Fritsch & Carlson do so that they increase.
+  #Starting from 64 equal intervals, any whose cubic is more than
+  #tolerance * (1 + |x|) from the idf at its middle, where the error is
+  #largest, is halved, the widest first, until INVERSIONLIMIT intervals
+  #have been tried.  Returns the left ends, widths and coefficients of
+  #the intervals, a guide table to them and the largest error left.
+  #==================================================================
+  pdf = getattr(rvms, 'pdf' + name)
+
+  def node(u):
+    x = idfBracketed(name, parameters, u)
+    return (u, x, 1.0 / pdf(*(parameters + (x,))))
+
+  nodes = [node(lo + (hi - lo) * j / 64.0) for j in range(0,65)]
+  todo = [(nodes[j], nodes[j + 1]) for j in range(0,64)]
+  done = []
+  error = 0.0
+  for a, b in todo:                    # halving the widest intervals first
+    w = b[0] - a[0]
+    s = b[1] - a[1]
+    m0 = w * a[2]
+    m1 = w * b[2]
+    if (m0 * m0 + m1 * m1 > 9.0 * s * s):
+      t = 3.0 * s / sqrt(m0 * m0 + m1 * m1)
+      m0 *= t
+      m1 *= t
+    c2 = 3.0 * s - 2.0 * m0 - m1
+    c3 = m0 + m1 - 2.0 * s
+    mid = node(a[0] + 0.5 * w)
+    e = abs(a[1] + 0.5 * (m0 + 0.5 * (c2 + 0.5 * c3)) - mid[1])
+    e /= 1.0 + abs(mid[1])
+    if (e > tolerance) and (len(todo) < INVERSIONLIMIT):
+      todo.append((a, mid))
+      todo.append((mid, b))
+    else:
+      done.append((a[0], w, a[1], m0, c2, c3))
+      error = max(error, e)
+  done.sort()
+  left = [d[0] for d in done] + [hi]
+  width = [d[1] for d in done]
+  c = [[d[k] for d in done] for k in range(2,6)]
+  g = len(width)
+  guide = []
+  k = 0
+  for j in range(0,g):
+    while (left[k + 1] <= lo + (hi - lo) * j / g):
+      k += 1
+    guide.append(k)
+  return (left, width, c, guide, error)
+
+
 def testFunctions():
   #tests to ensure that all variates match what was produced by C version of program (with the same order and parameters)
 
@@ -311,3 +2006,380 @@ def testFunctions():
   else:
     print("FIX STUDENT - Produced: ", stu)
     print("Expected: -1.429058")
+
+def KolmogorovSmirnov(x, cdf):
+  #=====================================================================
+  #Returns sqrt(n) * D, where D is the Kolmogorov-Smirnov statistic of the
+  #sample x against the cdf; larger than 1.63 rejects at the 1% level.
+  #=====================================================================
+  x = sorted(x)
+  n = len(x)
+  d = 0.0
+  for i in range(0,n):
+    F = cdf(x[i])
+    d = max(d, F - i / n, (i + 1) / n - F)
+  return (sqrt(n) * d)
+
+def KolmogorovSmirnovLimit(tests):
+  #=====================================================================
+  #Returns the value of KolmogorovSmirnov that rejects at the 1% level
+  #when it is one of tests checks that should all pass (Bonferroni: each
+  #at 1% / tests), 1.63 for a single check.
+  #=====================================================================
+  return sqrt(-0.5 * log(0.005 / tests))
+
+def testDistribution():
+  #tests that a dist object bound to a stream keeps drawing its values
+  #when prefetch and countDraws replace the stream objects
+  rngs.plantSeeds(7)
+  d = dist.Exponential(2.0, stream=3)
+  x = [d.sample() for i in range(0,3)]
+  rngs.prefetch(16)
+  x += [d.sample() for i in range(0,3)]
+  rngs.countDraws(True)
+  x += list(d.sample(3)) + [d.sample()]
+  counted = (rngs.streams.drawCounts().get(3) == 4)
+  rngs.countDraws(False)
+  rngs.prefetch(0)
+  rngs.plantSeeds(7)
+  rngs.selectStream(3)
+  y = [Exponential(2.0) for i in range(0,10)]
+  rngs.selectStream(0)
+  if (counted) and (max(abs(a - b) for a, b in zip(x, y)) < 1e-12):
+    print("Distribution test passed")
+  else:
+    print("FIX DISTRIBUTION BINDING")
+
+def testSize():
+  #tests that size=n gives the variates of n scalar calls and leaves the
+  #stream where they leave it, for every generator and method
+  fast = {'method': 'fast'}
+  cases = ((Bernoulli, (0.3,), {}), (Binomial, (10, 0.4), {}),
+           (Binomial, (200, 0.4), {}), (Binomial, (10, 0.4), fast),
+           (Binomial, (200, 0.7), fast), (Equilikely, (1, 6), {}),
+           (Geometric, (0.4,), {}), (Pascal, (3, 0.4), {}),
+           (Pascal, (3, 0.4), fast), (Pascal, (5, 0.9999), fast),
+           (Poisson, (4.5,), {}), (Poisson, (4.5,), fast),
+           (Poisson, (30.0,), fast), (Uniform, (1.0, 3.0), {}),
+           (Exponential, (2.0,), {}), (Erlang, (5, 2.0), {}),
+           (Erlang, (5, 2.0), fast), (Erlang, (20, 2.0), fast),
+           (StandardGamma, (2.5,), {}), (Normal, (1.0, 2.0), {}),
+           (Normal, (1.0, 2.0), fast), (Lognormal, (0.0, 0.5), {}),
+           (Lognormal, (0.0, 0.5), fast), (Chisquare, (4,), {}),
+           (Chisquare, (4,), fast), (Student, (5,), {}),
+           (Student, (5,), fast))
+  for f, args, options in cases:
+    rngs.plantSeeds(97531)
+    x = [f(*args, **options) for i in range(0,1000)]
+    seed = rngs.getSeed()
+    rngs.plantSeeds(97531)
+    y = list(f(*args, size=1000, **options))
+    same = all(abs(a - b) <= 1e-12 * (1.0 + abs(a)) for a, b in zip(x, y))
+    name = "{0}{1} {2}".format(f.__name__, args, options.get('method', 'legacy'))
+    if (same) and (len(y) == 1000) and (rngs.getSeed() == seed):
+      print("size= test passed ({0})".format(name))
+    else:
+      print("FIX SIZE= ({0})".format(name))
+
+def testErlang():
+  #tests that Erlang(n, b, method='fast') has the distribution of rvms.cdfErlang,
+  #on both sides of ERLANGGAMMA and for the scalar and size= paths
+  rngs.plantSeeds(12345)
+  cases = (1, 5, ERLANGGAMMA - 1, ERLANGGAMMA, 40)
+  for n in cases:
+    x = [Erlang(n, 2.0, method='fast') for i in range(0,5000)]
+    x += list(Erlang(n, 2.0, size=5000, method='fast'))
+    d = KolmogorovSmirnov(x, lambda t: rvms.cdfErlang(n, 2.0, t))
+    if (d < KolmogorovSmirnovLimit(len(cases))):
+      print("Erlang fast test passed (n = {0})".format(n))
+    else:
+      print("FIX FAST ERLANG (n = {0}) - K-S statistic: {1:.3f}".format(n, d))
+
+def testChisquareStudent():
+  #tests that Chisquare(n, method='fast') and Student(n, method='fast') have
+  #the distributions of rvms.cdfChisquare and rvms.cdfStudent
+  rngs.plantSeeds(12345)
+  limit = KolmogorovSmirnovLimit(6)
+  for n in (1, 4, 39):
+    x = [Chisquare(n, method='fast') for i in range(0,5000)]
+    x += list(Chisquare(n, size=5000, method='fast'))
+    d = KolmogorovSmirnov(x, lambda t: rvms.cdfChisquare(n, t))
+    if (d < limit):
+      print("Chisquare fast test passed (n = {0})".format(n))
+    else:
+      print("FIX FAST CHI-SQUARE (n = {0}) - K-S statistic: {1:.3f}".format(n, d))
+
+  for n in (1, 3, 61):
+    x = [Student(n, method='fast') for i in range(0,5000)]
+    x += list(Student(n, size=5000, method='fast'))
+    d = KolmogorovSmirnov(x, lambda t: rvms.cdfStudent(n, t))
+    if (d < limit):
+      print("Student fast test passed (n = {0})".format(n))
+    else:
+      print("FIX FAST STUDENT (n = {0}) - K-S statistic: {1:.3f}".format(n, d))
+
+def testPascal():
+  #tests that Pascal(n, p, method='fast') has the distribution of rvms.pdfPascal,
+  #with a chi-square test over the values expected at least 20 times
+  for n, p in ((1, 0.5), (87, 0.93), (5000, 0.8), (300000, 0.1)):
+    x = [Pascal(n, p, method='fast') for i in range(0,5000)]
+    x += list(Pascal(n, p, size=5000, method='fast'))
+    counts = {}
+    for v in x:
+      counts[v] = counts.get(v, 0) + 1
+    chisq = 0.0
+    df = -1
+    for v in counts:
+      e = len(x) * rvms.pdfPascal(n, p, v)
+      if (e >= 20.0):
+        chisq += (counts[v] - e) * (counts[v] - e) / e
+        df += 1
+    if (df < 1) or (chisq < rvms.idfChisquare(df, 0.99)):
+      print("Pascal fast test passed (n = {0}, p = {1})".format(n, p))
+    else:
+      print("FIX FAST PASCAL (n = {0}, p = {1}) - chi-square: {2:.1f} on {3} df".format(n, p, chisq, df))
+
+def ChiSquareFit(x, pdf):
+  #=====================================================================
+  #Returns the chi-square statistic of the integer sample x against the
+  #pdf, over the values expected at least 20 times, and its degrees of
+  #freedom.
+  #=====================================================================
+  counts = {}
+  for v in x:
+    counts[v] = counts.get(v, 0) + 1
+  chisq = 0.0
+  df = -1
+  for v in counts:
+    e = len(x) * pdf(v)
+    if (e >= 20.0):
+      chisq += (counts[v] - e) * (counts[v] - e) / e
+      df += 1
+  return (chisq, df)
+
+def testBinomial():
+  #tests that Binomial(n, p, method='fast') has the distribution of
+  #rvms.pdfBinomial, by inversion (n * min(p, 1 - p) < 30) and by BTPE,
+  #on both sides of p = 0.5 and for the scalar and size= paths
+  rngs.plantSeeds(12345)
+  cases = ((20, 0.3), (40, 0.9), (500, 0.3), (1000, 0.8))
+  for n, p in cases:
+    x = [Binomial(n, p, method='fast') for i in range(0,5000)]
+    x += list(Binomial(n, p, size=5000, method='fast'))
+    chisq, df = ChiSquareFit(x, lambda v: rvms.pdfBinomial(n, p, v))
+    if (df >= 1) and (chisq < rvms.idfChisquare(df, 1.0 - 0.01 / len(cases))):
+      print("Binomial fast test passed (n = {0}, p = {1})".format(n, p))
+    else:
+      print("FIX FAST BINOMIAL (n = {0}, p = {1}) - chi-square: {2:.1f} on {3} df".format(n, p, chisq, df))
+
+def testPoisson():
+  #tests that Poisson(m, method='fast') has the distribution of
+  #rvms.pdfPoisson, by the cdf table (m < POISSONPTRS) and by PTRS, for
+  #the scalar and size= paths
+  rngs.plantSeeds(12345)
+  cases = (0.5, 4.5, 30.0, 250.0)
+  for m in cases:
+    x = [Poisson(m, method='fast') for i in range(0,5000)]
+    x += list(Poisson(m, size=5000, method='fast'))
+    chisq, df = ChiSquareFit(x, lambda v: rvms.pdfPoisson(m, v))
+    if (df >= 1) and (chisq < rvms.idfChisquare(df, 1.0 - 0.01 / len(cases))):
+      print("Poisson fast test passed (m = {0})".format(m))
+    else:
+      print("FIX FAST POISSON (m = {0}) - chi-square: {1:.1f} on {2} df".format(m, chisq, df))
+
+def testNormal():
+  #tests that Normal(0, 1, method='fast') has the mean, variance and
+  #distribution (rvms.cdfNormal) of a standard normal
+  x = [Normal(0.0, 1.0, method='fast') for i in range(0,20000)]
+  x += list(Normal(0.0, 1.0, size=20000, method='fast'))
+  n = len(x)
+  mean = sum(x) / n
+  var = sum((t - mean) * (t - mean) for t in x) / n
+  d = KolmogorovSmirnov(x, lambda t: rvms.cdfNormal(0.0, 1.0, t))
+  if (abs(mean) < 4.0 / sqrt(n)) and (abs(var - 1.0) < 4.0 * sqrt(2.0 / n)) and (d < 1.63):
+    print("Normal fast test passed")
+  else:
+    print("FIX FAST NORMAL - mean {0:.4f} variance {1:.4f} K-S statistic {2:.3f}".format(mean, var, d))
+
+def benchNormal(n=200000):
+  #prints the time taken by n Normal variates with each method
+  from time import perf_counter
+  for method in ('legacy', 'fast'):
+    t = perf_counter()
+    for i in range(0,n):
+      Normal(0.0, 1.0, method=method)
+    scalar = perf_counter() - t
+    t = perf_counter()
+    Normal(0.0, 1.0, size=n, method=method)
+    block = perf_counter() - t
+    print("{0:>6}: {1:.3f} s scalar, {2:.3f} s with size={3}".format(method, scalar, block, n))
+
+def testAlias():
+  #tests that dist.Alias has the distribution it is given, with a
+  #chi-square test for the scalar and size= paths, and that it pickles
+  from pickle import dumps, loads
+  weights = [5, 0, 1, 12, 3, 3, 40, 2, 9]
+  a = loads(dumps(dist.Alias(weights)))
+  x = [a.sample() for i in range(0,9000)] + list(a.sample(9000))
+  chisq = 0.0
+  for v in range(0,len(weights)):
+    e = len(x) * weights[v] / sum(weights)
+    if (e > 0.0):
+      chisq += (x.count(v) - e) * (x.count(v) - e) / e
+    elif (x.count(v) > 0):
+      chisq = float('inf')
+  if (chisq < rvms.idfChisquare(len(weights) - 2, 0.99)):
+    print("Alias test passed")
+  else:
+    print("FIX ALIAS - chi-square: {0:.1f}".format(chisq))
+
+def testInversion():
+  #tests dist.Inversion against the exact rvms idf on a grid of u, and
+  #that its size= path gives the same variates
+  for args in (('Poisson', 4.5), ('Binomial', 40, 0.3), ('Normal', 1.0, 2.0),
+               ('Chisquare', 4)):
+    d = dist.Inversion(*args)
+    idf = getattr(rvms, 'idf' + args[0])
+    u = [(k + 0.5) / 1000.0 for k in range(0,1000)]
+    x = [idf(*(args[1:] + (t,))) for t in u]
+    error = max(abs(d.value(t) - y) / (1.0 + abs(y)) for t, y in zip(u, x))
+    same = True
+    if (numpy is not None):
+      same = numpy.allclose(d.values(numpy.array(u)), [d.value(t) for t in u],
+                            rtol=1e-15, atol=0.0)
+    if (error <= max(d.error, 10.0 * rvms.TINY)) and (same):
+      print("Inversion test passed ({0})".format(args[0]))
+    else:
+      print("FIX INVERSION ({0}) - error {1:.2e}".format(args[0], error))
+
+def testTape():
+  #tests that a tape replays the variates of its generator, past the
+  #length first recorded, and that the budget evicts older tapes
+  directory = tempfile.mkdtemp()
+  cache = TapeCache(directory, 3 * 8 * 1000)
+  rngs.plantSeeds(4321)
+  rngs.selectStream(1)
+  x = [Exponential(2.0) for i in range(0,2500)]
+  rngs.selectStream(0)
+  rngs.plantSeeds(99)
+  tape = cache.tape(Exponential, (2.0,), 1000, 4321, 1)
+  y = [tape() for i in range(0,2500)]
+  ok = (max(abs(a - b) / a for a, b in zip(x, y)) < 1e-15) and (rngs.getSeed() == 99)
+  tape.rewind()
+  ok = ok and (list(tape.block(2500)) == y)
+  for m in (1.0, 3.0, 4.0, 5.0):
+    cache.tape(Exponential, (m,), 1000, 4321, 1).close()
+  ok = ok and (len(os.listdir(directory)) == 3)
+  empty = cache.tape(Exponential, (6.0,), 0, 4321, 1)
+  ok = ok and (len(empty) == 0) and (abs(empty() - 3.0 * y[0]) < 1e-12)
+  rngs.antithetic(True)
+  flipped = cache.tape(Exponential, (2.0,), 1000, 4321, 1)
+  ok = ok and (rngs.streams.flipped)
+  rngs.antithetic(False)
+  ok = ok and (flipped() != y[0])
+  saved = rngs.streams                 # a tape grown after useBackend keeps
+  rngs.useBackend('mrg32k3a')          # its values and leaves the new set
+  rngs.countDraws(True)                # and its counts alone
+  rngs.plantSeeds(99)
+  rngs.random()
+  tape.rewind()
+  z = tape.block(len(tape) + 1)
+  ok = ok and (list(z[0:2500]) == y) and (rngs.drawCounts() == {0: 1})
+  ok = ok and (rngs.streams.name == 'mrg32k3a')
+  rngs.streams = saved
+  rngs.newGeneration()
+  empty.close()
+  flipped.close()
+  tape.close()
+  cache.clear()
+  os.rmdir(directory)
+  if (ok):
+    print("Tape test passed")
+  else:
+    print("FIX TAPES")
+
+def testArrivals():
+  #tests that an ArrivalProcess gives the times of the scalar loop, on its
+  #own stream and leaving the current stream selected
+  rngs.plantSeeds(2468)
+  rngs.selectStream(3)
+  t = 10.0
+  x = []
+  for i in range(0,3000):
+    t += Exponential(2.0)
+    x.append(t)
+  rngs.plantSeeds(2468)
+  rngs.selectStream(5)
+  arrivals = iter(ArrivalProcess(Exponential, (2.0,), 10.0, stream=3, size=512))
+  y = [next(arrivals) for i in range(0,3000)]
+  ok = (rngs.streams.stream == 5)
+  ok = ok and (max(abs(a - b) for a, b in zip(x, y)) < 1e-9)
+  rngs.plantSeeds(2468)
+  rngs.selectStream(3)
+  arrivals = iter(ArrivalProcess(Exponential, (2.0,), 10.0, size=512))
+  rngs.selectStream(5)                 # the default stream is the one
+  y = [next(arrivals) for i in range(0,3000)]   # current when made
+  ok = ok and (max(abs(a - b) for a, b in zip(x, y)) < 1e-9)
+  if (ok):
+    print("ArrivalProcess test passed")
+  else:
+    print("FIX ARRIVAL PROCESS")
+
+def testNonstationary():
+  #tests the numbers of NonstationaryArrivals in the hours of a cyclic
+  #piecewise-linear day, and the block times against the scalar ones
+  knots = [0.0, 6.0, 9.0, 12.0, 17.0, 20.0, 24.0]
+  rates = [0.5, 1.0, 12.0, 4.0, 10.0, 2.0, 0.5]
+  arrivals = NonstationaryArrivals(knots, rates, linear=True, cycle=True)
+  days = 200
+  counts = [0] * 24
+  for t in arrivals:
+    if (t >= 24.0 * days):
+      break
+    counts[int(t) % 24] += 1
+  chisq = 0.0
+  for h in range(0,24):
+    e = days * (arrivals.cumulativeAt(h + 1.0) - arrivals.cumulativeAt(h))
+    chisq += (counts[h] - e) * (counts[h] - e) / e
+  ok = (chisq < rvms.idfChisquare(24, 0.99))
+  s = [0.1 * k for k in range(0,4000)]
+  if (numpy is not None):
+    t = arrivals.timesAt(numpy.array(s))
+    ok = ok and (max(abs(arrivals.timeAt(x) - y) for x, y in zip(s, t)) < 1e-9)
+  ok = ok and (max(abs(arrivals.cumulativeAt(arrivals.timeAt(x)) - x) for x in s) < 1e-9)
+  if (ok):
+    print("NonstationaryArrivals test passed")
+  else:
+    print("FIX NONSTATIONARY ARRIVALS - chi-square: {0:.1f}".format(chisq))
+
+def testTruncated():
+  #tests dist.Truncated against the truncated cdf with a K-S test, for
+  #both methods, and that the variates stay in the window
+  rngs.plantSeeds(12345)
+  limit = KolmogorovSmirnovLimit(12)
+  for args, a, b in ((('Normal', 0.0, 1.0), 1.5, 2.5),
+                     (('Normal', 0.0, 1.0), 5.0, 6.0),
+                     (('Normal', 0.0, 1.0), -6.0, -5.0),
+                     (('Exponential', 2.0), 0.5, None),
+                     (('Exponential', 1.0), 12.0, None),
+                     (('Lognormal', 0.0, 0.5), None, 1.2)):
+    cdf = getattr(rvms, 'cdf' + args[0])
+    low = 0.0 if (a is None) else cdf(*(args[1:] + (a,)))
+    high = 1.0 if (b is None) else cdf(*(args[1:] + (b,)))
+    for method in ('legacy', 'fast'):
+      d = dist.Truncated(*args, a=a, b=b, method=method)
+      x = [d.sample() for i in range(0,2000)] + list(d.sample(2000))
+      inside = ((a is None) or (min(x) >= a)) and ((b is None) or (max(x) <= b))
+      k = KolmogorovSmirnov(x, lambda t: (cdf(*(args[1:] + (t,))) - low) / (high - low))
+      if (inside) and (k < limit):
+        print("Truncated test passed ({0}, {1})".format(args[0], method))
+      else:
+        print("FIX TRUNCATED ({0}, {1}) - K-S statistic: {2:.3f}".format(args[0], method, k))
+
+  d = dist.Truncated('Poisson', 4.5, a=3, b=7, method='fast')
+  e = dist.Truncated('Poisson', 4.5, a=3, b=7)
+  u = [(k + 0.5) / 500.0 for k in range(0,500)]
+  if ([d.value(t) for t in u] == [e.value(t) for t in u]) and (min(d.value(t) for t in u) == 3):
+    print("Truncated test passed (Poisson)")
+  else:
+    print("FIX TRUNCATED (Poisson)")